@@ -1,15 +1,42 @@
-from flask import Flask, jsonify, request, redirect, session, render_template
+from flask import Flask, jsonify, request, redirect, session, render_template, has_app_context, Response
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_sqlalchemy import SQLAlchemy
-from functools import wraps
-from datetime import datetime
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from functools import wraps, partial
+from datetime import datetime, timedelta
 from services.themes import get_all_trickia_themes, is_valid_trickia_theme, get_opentdb_categories, get_triviaapi_tags
-from services.bandit import update_bandit_for_session
-from services.bandit import beta_mean, make_relative_buckets, choose_bucket, choose_difficulty
-import requests
+from services.bandit import BanditCache, ThompsonSelector, ArmStore, DIFFICULTIES, flush_arm_deltas
+from services.write_behind import WriteBehindBuffer
+from services.profile_summary import refresh_profile_summary
+from services.leaderboard import Leaderboards, METRICS
+from services.answer_events import (
+    AnswerEventLog, answer_event, export_columnar, import_legacy_stats, parquet_available
+)
+from ml.features import UserFeatures
+from ml.predictor import Predictor
+from services.sqlite_profile import install_sqlite_profile, ensure_indexes, current_pragmas
+from services.snapshot_retention import lttb, compact_snapshots, KEEP_RECENT_STEPS, BUCKET_SIZE
+from services.question_pool import QuestionPool
+from services.question_bank import store_questions, pick_unseen, pick_unseen_many, sample_bucket, ensure_fulltext_index
+from services.question_import import import_question_dump, DECODERS
+from services.concurrent_fetch import make_executor, first_accepted
+from services.providers import (
+    ProviderClient, ProviderEmpty, check_opentdb_response, check_triviaapi_response, OPENTDB_RATE_LIMIT_SECONDS
+)
+from services.provider_health import ProviderHealth, ProviderRouter
+from services.seen_filter import SeenFilterCache
+from services.session_persistence import persist_session_results
+from services.session_store import (
+    QuizStateStore, LRUStore, SQLiteStore, RedisStore, DictRedis, TieredStore, short_hash
+)
+import click
 import html
+import json
+import os
 import random
 import hashlib
+import secrets
+import time
 
 # =====================================================
 # APP & DB CONFIG
@@ -17,10 +44,61 @@ import hashlib
 app = Flask(__name__, static_folder="static", static_url_path="/static")
 app.secret_key = "change_this_secret_key"
 
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///trickia.db"
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///trickia.db")
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["QUESTION_POOL_BATCH_SIZE"] = 50   # amount= per upstream call
+app.config["QUESTION_POOL_LOW_WATER"] = 10    # refill a bucket under this size
+
+# Question source: "live" (providers + bank) or "bank" (offline: imported/banked
+# questions only, never a network call; see `flask import-questions`)
+app.config["QUESTION_SOURCE"] = os.environ.get("QUESTION_SOURCE", "live")
+
+# Providers (pooled keep-alive sessions, see services/providers.py)
+app.config["OPENTDB_BASE_URL"] = os.environ.get("OPENTDB_BASE_URL", "https://opentdb.com")
+app.config["TRIVIAAPI_BASE_URL"] = os.environ.get("TRIVIAAPI_BASE_URL", "https://the-trivia-api.com")
+app.config["PROVIDER_TIMEOUT"] = float(os.environ.get("PROVIDER_TIMEOUT", 5))
+app.config["PROVIDER_POOL_MAXSIZE"] = int(os.environ.get("PROVIDER_POOL_MAXSIZE", 10))  # sockets per host
+app.config["PROVIDER_MAX_RETRIES"] = int(os.environ.get("PROVIDER_MAX_RETRIES", 2))
+app.config["PROVIDER_CIRCUIT_OPEN_SECONDS"] = float(os.environ.get("PROVIDER_CIRCUIT_OPEN_SECONDS", 30))
+# OpenTDB: 1 request / 5s / IP, paced client-side for every thread (pool worker + live fan-out)
+app.config["OPENTDB_MIN_INTERVAL"] = float(os.environ.get("OPENTDB_MIN_INTERVAL", OPENTDB_RATE_LIMIT_SECONDS))
+
+# quiz_state backend: "sqlite" (default, shared by all workers), "tiered" (LRU + sqlite,
+# single process only), "memory" (LRU only) or "redis" (REDIS_URL, else local stub)
+app.config["QUIZ_STATE_BACKEND"] = os.environ.get("QUIZ_STATE_BACKEND", "sqlite")
+app.config["QUIZ_STATE_LRU_SIZE"] = int(os.environ.get("QUIZ_STATE_LRU_SIZE", 10000))
+app.config["QUIZ_STATE_TTL"] = int(os.environ.get("QUIZ_STATE_TTL", 24 * 3600))  # seconds, sqlite / redis
+app.config["REDIS_URL"] = os.environ.get("REDIS_URL")
+
+# UserSeenQuestion write-behind: flush every N rows or T ms (and at session end)
+app.config["SEEN_WRITE_BATCH"] = int(os.environ.get("SEEN_WRITE_BATCH", 100))
+app.config["SEEN_WRITE_DELAY_MS"] = int(os.environ.get("SEEN_WRITE_DELAY_MS", 500))
+
+# Answer event log (append-only, one directory per day) and its columnar export
+app.config["ANSWER_EVENTS_DIR"] = os.environ.get("ANSWER_EVENTS_DIR", os.path.join("data", "events"))
+app.config["ANSWER_EXPORT_DIR"] = os.environ.get("ANSWER_EXPORT_DIR", os.path.join("data", "exports"))
+
+# P(correct) predictor (ml/predictor.py): rank pool candidates toward this success rate.
+# Only a model whose holdout log loss beats the base rate is loaded; otherwise plain pool pick.
+app.config["PREDICTOR_ENABLED"] = os.environ.get("PREDICTOR_ENABLED", "1") == "1"
+app.config["PREDICTOR_TARGET_SUCCESS"] = float(os.environ.get("PREDICTOR_TARGET_SUCCESS", 0.7))
+
+# Leaderboards: minimum answers to be ranked on accuracy, rebuild period (other workers)
+app.config["LEADERBOARD_MIN_QUESTIONS"] = int(os.environ.get("LEADERBOARD_MIN_QUESTIONS", 20))
+app.config["LEADERBOARD_MAX_AGE"] = float(os.environ.get("LEADERBOARD_MAX_AGE", 300))
+
+# /api/model/history: max points per theme (LTTB), overridable with ?max_points=
+app.config["MODEL_HISTORY_MAX_POINTS"] = int(os.environ.get("MODEL_HISTORY_MAX_POINTS", 60))
+
+# SQLite: "production" = WAL + synchronous=NORMAL + busy timeout + mmap
+# (services/sqlite_profile.py), "default" = SQLite defaults (rollback journal)
+app.config["SQLITE_PROFILE"] = os.environ.get("SQLITE_PROFILE", "production")
 db = SQLAlchemy(app)
 
+with app.app_context():
+    if app.config["SQLITE_PROFILE"] == "production":
+        install_sqlite_profile(db.engine)
+
 # =====================================================
 # MODELS
 # =====================================================
@@ -57,6 +135,7 @@ class UserSeenQuestion(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("user_id", "question_hash", name="uq_user_question"),
+        db.Index("ix_user_seen_user_theme", "user_id", "theme"),
     )
 
 class UserAchievement(db.Model):
@@ -97,6 +176,75 @@ class UserThemeBanditSnapshot(db.Model):
 
     __table_args__ = (
         db.Index("ix_user_step", "user_id", "step"),
+        db.Index("ix_snapshot_user_theme_step", "user_id", "theme", "step"),
+    )
+
+class UserThemeDifficultyArm(db.Model):
+    # Bras (theme x difficulté) mis à jour à chaque réponse (write-behind, services/bandit.py)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    theme = db.Column(db.String(50), nullable=False)
+    difficulty = db.Column(db.String(10), nullable=False)
+
+    alpha = db.Column(db.Float, default=1.0)  # prior
+    beta = db.Column(db.Float, default=1.0)   # prior
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "theme", "difficulty", name="uq_user_theme_difficulty_arm"),
+    )
+
+class Question(db.Model):
+    # Banque de questions : tout ce qui est fetché chez un provider finit ici
+    hash = db.Column(db.String(64), primary_key=True)  # compute_question_hash(text)
+    theme = db.Column(db.String(50), nullable=False)   # Trickia theme
+    difficulty = db.Column(db.String(10))
+    source = db.Column(db.String(30))
+
+    text = db.Column(db.Text, nullable=False)
+    correct = db.Column(db.Text, nullable=False)
+    answers = db.Column(db.JSON, nullable=False)       # incorrect + correct
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_question_theme_difficulty", "theme", "difficulty"),
+    )
+
+class UserSeenFilter(db.Model):
+    # Bloom filter persisté (services/seen_filter.py), reconstructible depuis UserSeenQuestion
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    capacity = db.Column(db.Integer, nullable=False)
+    error_rate = db.Column(db.Float, nullable=False)
+    count = db.Column(db.Integer, default=0)
+    last_row_id = db.Column(db.Integer, default=0)  # UserSeenQuestion.id déjà inclus
+    bits = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class QuizSessionState(db.Model):
+    # quiz_state côté serveur (services/session_store.py) : le cookie ne garde que l'id
+    id = db.Column(db.String(64), primary_key=True)  # session["quiz_sid"] (+ ":next")
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    data = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UserProfileSummary(db.Model):
+    # /api/profile matérialisé (services/profile_summary.py), reconstruit en fin de session
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    data = db.Column(db.Text, nullable=False)       # JSON prêt à servir
+    version = db.Column(db.Integer, default=1)      # -> ETag
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)  # -> Last-Modified
+
+class SessionResult(db.Model):
+    # Réponse de /api/session/end, rejouée telle quelle si le client réessaie
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    key = db.Column(db.String(100), primary_key=True)  # Idempotency-Key (défaut : quiz_sid)
+    sid = db.Column(db.String(64))                     # session_key(quiz_sid) : une seule clé par session
+    response = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("uq_session_result_sid", "sid", unique=True),
     )
 
 # =====================================================
@@ -124,6 +272,102 @@ def compute_question_hash(question_text: str) -> str:
     normalized = " ".join((question_text or "").lower().strip().split())
     return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
 
+# Per-user Bloom filters in front of the UserSeenQuestion lookups
+SEEN_FILTERS = SeenFilterCache(db, UserSeenQuestion, UserSeenFilter)
+
+def flush_seen(rows):
+    with app.app_context():
+        stmt = sqlite_insert(UserSeenQuestion.__table__).on_conflict_do_nothing(
+            index_elements=["user_id", "question_hash"]
+        )
+        db.session.execute(stmt, rows)
+        db.session.commit()
+
+# Seen-question rows are written behind (one bulk insert every N rows / T ms,
+# and at end_session). A hard crash loses at most the rows of the last
+# SEEN_WRITE_DELAY_MS: those questions may be served again in a later session.
+SEEN_WRITER = WriteBehindBuffer(
+    flush_seen,
+    max_items=app.config["SEEN_WRITE_BATCH"],
+    max_delay=app.config["SEEN_WRITE_DELAY_MS"] / 1000,
+    name="seen-writer"
+)
+
+# Per-user bandit scores, versioned (services/bandit.py)
+BANDIT_CACHE = BanditCache()
+
+# Theme x difficulty arms: updated in memory at each answer, flushed behind
+ARM_STORE = ArmStore(db, UserThemeDifficultyArm)
+
+def flush_arms(deltas):
+    with app.app_context():
+        flush_arm_deltas(db, UserThemeDifficultyArm, deltas)
+
+ARM_WRITER = WriteBehindBuffer(flush_arms, max_items=200, max_delay=2.0, name="arm-writer")
+
+# Per-answer events: buffered, appended to the day's partition in batches
+ANSWER_LOG = AnswerEventLog(app.config["ANSWER_EVENTS_DIR"])
+ANSWER_WRITER = WriteBehindBuffer(ANSWER_LOG.append_many, max_items=500, max_delay=1.0, name="answer-writer")
+
+def session_key(sid):
+    """Stable, non-secret id of a quiz session for the event log (the sid is a credential)."""
+    return hashlib.sha256(sid.encode("utf-8")).hexdigest()[:16] if sid else None
+
+# Lazy model + per-user feature cache; inactive until ml/train.py has written a model
+PREDICTOR = Predictor()
+
+def load_user_features(user_id):
+    rows = db.session.query(
+        UserThemeStats.theme, UserThemeStats.total_questions, UserThemeStats.correct_answers
+    ).filter_by(user_id=user_id).all()
+    return UserFeatures.from_counts(
+        {theme: (total or 0, correct or 0) for theme, total, correct in rows},
+        ARM_STORE.get(user_id)
+    )
+
+# Cross-user rank indexes, updated at end_session (services/leaderboard.py)
+LEADERBOARDS = Leaderboards(
+    db, UserThemeStats,
+    min_questions=app.config["LEADERBOARD_MIN_QUESTIONS"],
+    max_age=app.config["LEADERBOARD_MAX_AGE"],
+    app_context=app.app_context  # stale boards are rebuilt in a background thread
+)
+
+# =====================================================
+# QUIZ STATE (SERVER-SIDE)
+# =====================================================
+def make_quiz_state_backend(kind):
+    ttl = app.config["QUIZ_STATE_TTL"]
+    if kind == "memory":
+        return LRUStore(max_items=app.config["QUIZ_STATE_LRU_SIZE"])
+    if kind == "tiered":
+        return TieredStore(LRUStore(max_items=app.config["QUIZ_STATE_LRU_SIZE"]),
+                           SQLiteStore(db, QuizSessionState, ttl=ttl))
+    if kind == "redis":
+        url = app.config.get("REDIS_URL")
+        if url:
+            import redis  # optional dependency
+            return RedisStore(redis.Redis.from_url(url), ttl=ttl)
+        return RedisStore(DictRedis(), ttl=ttl)
+    return SQLiteStore(db, QuizSessionState, ttl=ttl)
+
+QUIZ_STATES = QuizStateStore(make_quiz_state_backend(app.config["QUIZ_STATE_BACKEND"]))
+
+def load_quiz_state():
+    return QUIZ_STATES.load(session.get("quiz_sid"))
+
+def save_quiz_state(state):
+    QUIZ_STATES.save(session["quiz_sid"], state, user_id=session.get("user_id"))
+
+def discard_quiz_state(sid):
+    """Drop a finished session; an unused prefetched question goes back to the pool."""
+    if not sid:
+        return
+    leftover = QUIZ_STATES.pop_next(sid)
+    if leftover:
+        QUESTION_POOL.push_many([leftover])
+    QUIZ_STATES.delete(sid)
+
 # =====================================================
 # FRONT ROUTES
 # =====================================================
@@ -171,69 +415,168 @@ def register():
 
 @app.route("/logout")
 def logout():
+    discard_quiz_state(session.get("quiz_sid"))
     session.clear()
     return redirect("/login")
 
 # =====================================================
 # TRIVIA FETCH
 # =====================================================
-def fetch_opentdb(category_id, difficulty=None):
-    url = "https://opentdb.com/api.php?amount=1&type=multiple"
-    if category_id:
-        url += f"&category={category_id}"
-    if difficulty in ("easy", "medium", "hard"):
-        url += f"&difficulty={difficulty}"
-    
-    r = requests.get(url, timeout=5)
-    data = r.json()
-
-    # 🔐 Validation stricte
-    if "results" not in data or not data["results"]:
-        raise ValueError("OpenTriviaDB returned no results")
-
-    q = data["results"][0]
-
-    question = html.unescape(q["question"])
-    correct = html.unescape(q["correct_answer"])
-    answers = [html.unescape(a) for a in q["incorrect_answers"]] + [correct]
+# Source split (70/30) scaled by live provider health
+PROVIDER_HEALTH = {
+    "OpenTriviaDB": ProviderHealth("OpenTriviaDB", open_seconds=app.config["PROVIDER_CIRCUIT_OPEN_SECONDS"]),
+    "TheTriviaAPI": ProviderHealth("TheTriviaAPI", open_seconds=app.config["PROVIDER_CIRCUIT_OPEN_SECONDS"])
+}
+PROVIDER_ROUTER = ProviderRouter(PROVIDER_HEALTH, {"OpenTriviaDB": 0.7, "TheTriviaAPI": 0.3})
+
+OPENTDB = ProviderClient(
+    "OpenTriviaDB",
+    app.config["OPENTDB_BASE_URL"],
+    check=check_opentdb_response,
+    health=PROVIDER_HEALTH["OpenTriviaDB"],
+    timeout=app.config["PROVIDER_TIMEOUT"],
+    pool_maxsize=app.config["PROVIDER_POOL_MAXSIZE"],
+    max_retries=app.config["PROVIDER_MAX_RETRIES"],
+    min_interval=app.config["OPENTDB_MIN_INTERVAL"]
+)
+TRIVIAAPI = ProviderClient(
+    "TheTriviaAPI",
+    app.config["TRIVIAAPI_BASE_URL"],
+    check=check_triviaapi_response,
+    health=PROVIDER_HEALTH["TheTriviaAPI"],
+    timeout=app.config["PROVIDER_TIMEOUT"],
+    pool_maxsize=app.config["PROVIDER_POOL_MAXSIZE"],
+    max_retries=app.config["PROVIDER_MAX_RETRIES"]
+)
+
+def make_pooled_question(question, correct, incorrect, difficulty, theme, source):
+    answers = list(incorrect) + [correct]
     random.shuffle(answers)
+    return {
+        "hash": compute_question_hash(question),
+        "question": question,
+        "correct": correct,
+        "answers": answers,
+        "difficulty": difficulty,
+        "theme": theme,
+        "source": source
+    }
 
-    return question, correct, answers, q["difficulty"]
+def fetch_opentdb_batch(category_id, difficulty=None, amount=50, theme=None):
+    params = {"amount": amount, "type": "multiple"}
+    if category_id:
+        params["category"] = category_id
+    if difficulty in ("easy", "medium", "hard"):
+        params["difficulty"] = difficulty
 
-def fetch_triviaapi(tags=None, difficulty=None):
-    url = "https://the-trivia-api.com/v2/questions?limit=1"
+    # 🔐 Validation stricte (response_code) dans check_opentdb_response.
+    # Code 1 = pas assez de questions pour `amount` : on redemande moins,
+    # en attendant le prochain créneau du client (1 requête / 5s, sinon code 5).
+    retrying = False
+    while True:
+        try:
+            data = OPENTDB.get_json("/api.php", params, wait=retrying)
+            break
+        except ProviderEmpty:
+            if params["amount"] <= 1:
+                raise
+            params["amount"] = max(1, params["amount"] // 3)
+            retrying = True
+
+    return [
+        make_pooled_question(
+            html.unescape(q["question"]),
+            html.unescape(q["correct_answer"]),
+            [html.unescape(a) for a in q["incorrect_answers"]],
+            q["difficulty"],
+            theme,
+            "OpenTriviaDB"
+        )
+        for q in data["results"]
+    ]
 
+def fetch_triviaapi_batch(tags=None, difficulty=None, limit=50, theme=None):
+    params = {"limit": limit}
     if tags:
-        joined = ",".join(tags)
-        url += f"&categories={joined}"
-
-    for _ in range(6):  # retry
-        try:
-            data = requests.get(url, timeout=5).json()
-            if not data:
-                continue
-            q = data[0]
-        except Exception:
-            continue
-
-        q_diff = q.get("difficulty", "unknown")
-        if difficulty and q_diff != difficulty:
-            continue
-
-        question = q["question"]["text"]
-        correct = q["correctAnswer"]
-        answers = q["incorrectAnswers"] + [correct]
-        random.shuffle(answers)
-
-        return (
-            question,
-            correct,
-            answers,
-            q_diff,
-            q.get("category", "")
+        params["categories"] = ",".join(tags)
+    # difficulty filtered server-side (no more fetch-and-discard)
+    if difficulty in ("easy", "medium", "hard"):
+        params["difficulties"] = difficulty
+
+    data = TRIVIAAPI.get_json("/v2/questions", params)
+
+    return [
+        make_pooled_question(
+            q["question"]["text"],
+            q["correctAnswer"],
+            q["incorrectAnswers"],
+            q.get("difficulty") or difficulty or "unknown",
+            theme,
+            "TheTriviaAPI"
         )
+        for q in data
+    ]
 
-    raise ValueError("No TriviaAPI question with requested difficulty")
+# =====================================================
+# QUESTION POOL (BACKGROUND REFILL)
+# =====================================================
+SOURCES = ("OpenTriviaDB", "TheTriviaAPI")
+
+def bank_questions(questions):
+    """Write-through to the persistent question bank (safe outside a request)."""
+    if has_app_context():
+        return store_questions(db, Question, questions)
+    with app.app_context():
+        return store_questions(db, Question, questions)
+
+def offline_mode():
+    return app.config["QUESTION_SOURCE"] == "bank"
+
+def refill_pool_bucket(theme, difficulty, source, amount):
+    """
+    Bulk fetch for one pool bucket (pool worker thread, or a live fan-out task).
+    The whole batch is banked and returned: QuestionPool.push_many / the
+    fan-out's on_leftover file every question under its *own* difficulty, so
+    a question that doesn't match the requested one is kept, not discarded.
+    """
+    if offline_mode():
+        # 📴 offline: the pool is refilled from the bank, never from the providers
+        if has_app_context():
+            return sample_bucket(db, Question, theme, difficulty, source, amount)
+        with app.app_context():
+            return sample_bucket(db, Question, theme, difficulty, source, amount)
+
+    if source == "OpenTriviaDB":
+        cats = get_opentdb_categories(theme)
+        if not cats:
+            return []
+        fetched = fetch_opentdb_batch(random.choice(cats), difficulty, amount=amount, theme=theme)
+    else:
+        tags = get_triviaapi_tags(theme)
+        if not tags:
+            return []
+        fetched = fetch_triviaapi_batch(tags, difficulty, limit=amount, theme=theme)
+
+    try:
+        bank_questions(fetched)
+    except Exception:
+        pass  # the bank is an optimisation, never block the pool on it
+    return fetched
+
+QUESTION_POOL = QuestionPool(
+    refill_pool_bucket,
+    batch_size=app.config.get("QUESTION_POOL_BATCH_SIZE", 50),
+    low_water=app.config.get("QUESTION_POOL_LOW_WATER", 10)
+)
+
+# Fan-out used on a pool & bank miss (see question())
+FETCH_EXECUTOR = make_executor(max_workers=16)
+LIVE_FETCH_THEMES = 3       # candidate themes of the chosen bucket
+LIVE_FETCH_AMOUNT = 10      # leftovers go to the pool
+LIVE_FETCH_TIMEOUT = 6.0    # one provider timeout (+ margin), not the sum of retries
+
+def pool_keys_for(themes, difficulties=("easy", "medium", "hard")):
+    return [(t, d, s) for t in themes for d in difficulties for s in SOURCES]
 
 # =====================================================
 # SESSION START
@@ -241,6 +584,11 @@ def fetch_triviaapi(tags=None, difficulty=None):
 @login_required
 @app.route("/api/session/start", methods=["POST"])
 def start_session():
+    # @login_required sits above @app.route here: the route is registered unwrapped
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Authentication required"}), 401
+
     data = request.get_json(silent=True) or {}
 
     # ✅ thèmes choisis par l'utilisateur (Trickia themes)
@@ -257,10 +605,14 @@ def start_session():
     if not selected:
         selected = get_all_trickia_themes()
 
-    session["quiz_state"] = {
+    # Nouvelle session : l'ancien état serveur ne sert plus
+    discard_quiz_state(session.get("quiz_sid"))
+    session["quiz_sid"] = secrets.token_urlsafe(32)
+
+    state = {
         "question_number": 0,
         "score": 0,
-        "used_hashes": [],   # session-level memory (fast)
+        "used_hashes": set(),   # session-level memory (fast, 8-byte hashes)
         "theme_stats": {},
         "best_streak": 0,
         "current_streak": 0,
@@ -270,6 +622,9 @@ def start_session():
         # ✅ NEW: thèmes autorisés pour cette session
         "allowed_themes": selected,
 
+        # longueur du mode (EXPRESS/COMMIT/FULL-STACK), borne le prefetch
+        "total_questions": int(data.get("total_questions") or 0),
+
         # 📊 API STATS (SESSION-BASED)
         "api_stats": {
             "OpenTriviaDB": {"total": 0, "correct": 0},
@@ -277,140 +632,398 @@ def start_session():
         }
     }
 
-    session.modified = True
-    return jsonify({"status": "ok", "allowed_themes": selected})
+    # Bandit posteriors read once for the whole session (+ fresh arms)
+    ARM_STORE.reload(user.id)
+    session_selector(user.id, selected, state)
 
-# =====================================================
-# QUESTION (STEP 4: PERSISTENT ANTI-DUPLICATES)
-# =====================================================
+    # Warm the pool for this session's themes (non-blocking)
+    QUESTION_POOL.request(pool_keys_for(selected))
+
+    result = {"status": "ok", "allowed_themes": selected}
+
+    # Optional: materialize the whole session (or chunks) in one pass
+    if data.get("materialize") and state["total_questions"] > 0:
+        state["plan"] = []
+        state["plan_cursor"] = 0
+        state["plan_chunk"] = max(1, int(data.get("chunk") or state["total_questions"]))
+        plan_questions(user.id, state, min(state["total_questions"], state["plan_chunk"]))
+
+        result["planned"] = len(state["plan"])
+        result["questions"] = [planned_payload(q) for q in state["plan"][:PLAN_PAGE_SIZE]]
+
+    save_quiz_state(state)
+    return jsonify(result)
 
+@app.route("/api/session/questions")
 @login_required
-@app.route("/api/question")
-def question():
-    user = get_current_user()
-    state = session.get("quiz_state")
+def session_questions():
+    """Pages of the planned session (answers stay server-side)."""
+    state = load_quiz_state()
+    if not state or "plan" not in state:
+        return jsonify({"error": "No planned session"}), 400
 
-    if not state:
-        return jsonify({"error": "Quiz not started"}), 400
+    page = max(0, request.args.get("page", 0, type=int))
+    size = min(50, max(1, request.args.get("size", PLAN_PAGE_SIZE, type=int)))
+    plan = state["plan"]
 
-    allowed = state.get("allowed_themes") or get_all_trickia_themes()
+    return jsonify({
+        "page": page,
+        "size": size,
+        "planned": len(plan),
+        "total_questions": state.get("total_questions", 0),
+        "questions": [planned_payload(q) for q in plan[page * size:(page + 1) * size]]
+    })
 
-    chosen = None
+# =====================================================
+# QUESTION (STEP 4: PERSISTENT ANTI-DUPLICATES)
+# =====================================================
+def session_selector(user_id, allowed, state=None):
+    """
+    Thompson-sampling selector over the allowed themes (services/bandit.py).
+    The session-level bandit only changes in end_session, so its (alpha, beta)
+    are read once per session and kept in the quiz state: no bandit DB read
+    mid-session. Adaptation within the session comes from memory only:
+    - this session's answers (theme_stats) on top of the theme posteriors
+    - the theme x difficulty arms of ARM_STORE, updated at every answer
+    """
+    if state is not None and state.get("bandit"):
+        params = state["bandit"]["params"]
+    else:
+        # params (cache process + version check) pour allowed themes
+        cached = BANDIT_CACHE.params(db, UserThemeBanditState, user_id)
+        params = {t: list(cached.get(t, (1.0, 1.0))) for t in allowed}  # (1, 1) = prior neutre
+        if state is not None:
+            state["bandit"] = {"params": params}
+
+    session_stats = (state or {}).get("theme_stats", {})
+    live = {}
+    for t, (a, b) in params.items():
+        s = session_stats.get(t, {})
+        live[t] = (a + s.get("correct", 0), b + s.get("total", 0) - s.get("correct", 0))
+
+    return ThompsonSelector.from_params(allowed, live, arms=ARM_STORE.get(user_id))
+
+def predicted_pool_pick(user_id, bucket_themes, skip):
+    """
+    Pool pick driven by the predictor: every stocked (theme, difficulty, source)
+    bucket of the bandit's themes is scored in one call, then tried closest to
+    the target success rate first. None when no validated model is loaded (see
+    ml/predictor.load_artifact) or on a miss: select_question then uses the plain pool pick.
+    """
+    if not app.config["PREDICTOR_ENABLED"] or not PREDICTOR.ready:
+        return None
 
-    # 1) scores depuis DB (pour allowed themes)
-    states = UserThemeBanditState.query.filter_by(user_id=user.id).all()
-    theme_to_state = {s.theme: s for s in states}
+    keys = [(t, d, s) for t in bucket_themes for d in DIFFICULTIES for s in SOURCES]
+    candidates = [k for k, n in zip(keys, QUESTION_POOL.stock(keys)) if n]
+    if not candidates:
+        return None
+
+    uf = PREDICTOR.user_features(user_id, partial(load_user_features, user_id))
+    for i in PREDICTOR.rank(uf, candidates, app.config["PREDICTOR_TARGET_SUCCESS"]):
+        theme, difficulty, source = candidates[i]
+        q = QUESTION_POOL.pop(theme, difficulty, [source], skip=skip)
+        if q:
+            return q
+    return None
+
+def select_question(user_id, state):
+    """
+    Pick the next question for this user/session (no side effect on the state).
+    Order: pool (memory) -> bank (one anti-join) -> live fan-out.
+    Offline mode (QUESTION_SOURCE=bank) stops after the bank.
+    Returns a pooled-question dict or None.
+    """
+    allowed = state.get("allowed_themes") or get_all_trickia_themes()
 
-    theme_to_score = {}
-    for t in allowed:
-        s = theme_to_state.get(t)
-        if s:
-            theme_to_score[t] = (s.alpha / (s.alpha + s.beta)) if (s.alpha + s.beta) > 0 else 0.5
-        else:
-            theme_to_score[t] = 0.5  # prior neutre
+    # themes ranked by one posterior draw, difficulty from the bucket
+    bucket_themes, target_difficulty = session_selector(user_id, allowed, state).pick()
 
-    weak, mid, strong = make_relative_buckets(allowed, theme_to_score)
+    used_hashes = state.get("used_hashes", set())
 
-    bucket = choose_bucket()
-    target_difficulty = choose_difficulty(bucket)
+    def already_seen(q_hash):
+        if short_hash(q_hash) in used_hashes:
+            return True
+        # Bloom filter: "no" is definitive, only a "maybe" costs a DB lookup
+        if not SEEN_FILTERS.might_have_seen(user_id, q_hash):
+            return False
+        return UserSeenQuestion.query.filter_by(
+            user_id=user_id,
+            question_hash=q_hash
+        ).first() is not None
 
-    if bucket == "strong" and strong:
-        bucket_themes = strong
-    elif bucket == "weak" and weak:
-        bucket_themes = weak
-    else:
-        bucket_themes = mid if mid else allowed
-    if not bucket_themes:
-        bucket_themes = allowed
+    # --------------------------------------------------
+    # 1) POOL (memory only, no network)
+    #    with a trained model: difficulty/source picked by predicted success
+    # --------------------------------------------------
+    q = predicted_pool_pick(user_id, bucket_themes, skip=lambda q: already_seen(q["hash"]))
+    if q:
+        return q
 
+    for theme in bucket_themes:
+        sources = PROVIDER_ROUTER.order(SOURCES)
+        q = QUESTION_POOL.pop(theme, target_difficulty, sources, skip=lambda q: already_seen(q["hash"]))
+        if q:
+            return q
 
-    # theme choisi dans le bucket
+    # --------------------------------------------------
+    # 2) QUESTION BANK (one indexed anti-join, no network)
+    # --------------------------------------------------
+    q = pick_unseen(db, Question, UserSeenQuestion, user_id, bucket_themes,
+                    difficulty=target_difficulty, skip=already_seen)
+    if q:
+        return q
 
     # --------------------------------------------------
-    # SAFE FETCH WITH TRICKIA THEMES + DEDUPE
+    # 3) LIVE FETCH: fan-out over several themes of the bucket
+    #    and every healthy source, first unseen question wins
+    #    (both circuits open => pool/bank only)
     # --------------------------------------------------
-    for _ in range(6):
-        try:
-            # 🎯 1. Choose Trickia theme
-            theme = random.choice(bucket_themes)
+    if offline_mode():
+        return None
 
-            opentdb_cats = get_opentdb_categories(theme)
-            trivia_tags = get_triviaapi_tags(theme)
+    live_sources = PROVIDER_ROUTER.available(SOURCES)
+    if not live_sources:
+        return None
 
-            # 🎯 2. Choose source (MIXED APIs - SAFE)
-            use_triviaapi = bool(trivia_tags) and random.random() < 0.3
+    candidates = random.sample(bucket_themes, min(LIVE_FETCH_THEMES, len(bucket_themes)))
+    tasks = [
+        partial(refill_pool_bucket, theme, target_difficulty, source, LIVE_FETCH_AMOUNT)
+        for theme in candidates
+        for source in live_sources
+        # OpenTDB answers 1 request / 5s: one task per fan-out, the others would get code 5
+        if source != "OpenTriviaDB" or theme == candidates[0]
+    ]
+    return first_accepted(
+        FETCH_EXECUTOR,
+        tasks,
+        accept=lambda q: q["difficulty"] == target_difficulty and not already_seen(q["hash"]),
+        timeout=LIVE_FETCH_TIMEOUT,
+        on_leftover=QUESTION_POOL.push_many
+    )
+
+def serve_question(user_id, state, q, persist=True):
+    """
+    Mark `q` as seen and make it the session's current question (caller saves the state).
+    persist=False: already recorded (planned session).
+    """
+    if persist:
+        record_seen_many(user_id, [q])
+
+    state.setdefault("used_hashes", set()).add(short_hash(q["hash"]))
+    state["question_number"] = q.get("n") or state.get("question_number", 0) + 1
 
-            if opentdb_cats and not use_triviaapi:
-                cid = random.choice(opentdb_cats)
-                q_text, c, a, d = fetch_opentdb(cid, difficulty=target_difficulty)
-                source = "OpenTriviaDB"
+    state["last"] = {
+        "question": q["question"],
+        "correct": q["correct"],
+        "answers": q["answers"],
+        "difficulty": q["difficulty"],
+        "theme": q["theme"],   # ✅ Trickia theme ONLY
+        "source": q["source"],
+        "hash": q["hash"],
+        "served_at": time.time(),  # -> response time in the answer event log
+        "answered": False
+    }
 
-            elif trivia_tags:
-                q_text, c, a, d, _ = fetch_triviaapi(trivia_tags, difficulty=target_difficulty)
-                source = "TheTriviaAPI"
+def question_payload(state):
+    last = state["last"]
+    return {
+        "id": state["question_number"],
+        "question": last["question"],
+        "answers": last["answers"],
+        "difficulty": last["difficulty"],
+        "category": last["theme"],
+        "source": last["source"]
+    }
 
-            else:
-                continue
+# =====================================================
+# SESSION PLAN (whole session or chunks, materialized in one pass)
+# =====================================================
+def record_seen_many(user_id, questions):
+    """
+    Queue UserSeenQuestion rows on SEEN_WRITER (bulk INSERT OR IGNORE, off the
+    request path). Dedupe until the flush: used_hashes (this session) and the
+    Bloom filter (updated right away) both already know these questions.
+    """
+    if not questions:
+        return
+    now = datetime.utcnow()
+    SEEN_WRITER.add_many([
+        {
+            "user_id": user_id,
+            "question_hash": q["hash"],
+            "source": q["source"],
+            "theme": q["theme"],
+            "first_seen": now,
+            "last_seen": now
+        } for q in questions
+    ])
+    for q in questions:
+        SEEN_FILTERS.add(user_id, q["hash"])
+
+def plan_questions(user_id, state, count):
+    """
+    Materialize `count` questions: one bandit read, pool pops (memory),
+    one bulk dedupe query, one bank anti-join for the holes, one bulk insert.
+    Appends to state["plan"]; returns how many were planned.
+    """
+    allowed = state.get("allowed_themes") or get_all_trickia_themes()
+    # every slot drawn in one vectorized call
+    slots = session_selector(user_id, allowed, state).plan(count)
+
+    used = set(state.get("used_hashes", ()))
+    used.update(short_hash(q["hash"]) for q in state.get("plan", []))
+    picked = [None] * count
+
+    # 1) pool: in-session dedupe only, history checked in bulk below
+    for i, (themes, difficulty) in enumerate(slots):
+        for theme in themes:
+            q = QUESTION_POOL.pop(theme, difficulty, PROVIDER_ROUTER.order(SOURCES),
+                                  skip=lambda q: short_hash(q["hash"]) in used)
+            if q:
+                picked[i] = q
+                used.add(short_hash(q["hash"]))
+                break
+
+    # 2) one bulk dedupe query against the user's history
+    hashes = [q["hash"] for q in picked if q]
+    seen = {
+        h for (h,) in db.session.query(UserSeenQuestion.question_hash).filter(
+            UserSeenQuestion.user_id == user_id,
+            UserSeenQuestion.question_hash.in_(hashes)
+        )
+    } if hashes else set()
+    for i, q in enumerate(picked):
+        if q and q["hash"] in seen:
+            QUESTION_POOL.push_many([q])  # still good for other users
+            picked[i] = None
+
+    # 3) holes: one anti-join on the bank, best match per slot
+    holes = [i for i, q in enumerate(picked) if q is None]
+    if holes:
+        extra = [
+            q for q in pick_unseen_many(db, Question, UserSeenQuestion, user_id, allowed, limit=3 * len(holes))
+            if short_hash(q["hash"]) not in used
+        ]
+        for i in holes:
+            themes, difficulty = slots[i]
+            match = next((q for q in extra if q["theme"] in themes and q["difficulty"] == difficulty), None)
+            match = match or next(iter(extra), None)
+            if match:
+                extra.remove(match)
+                picked[i] = match
+                used.add(short_hash(match["hash"]))
+
+    planned = [q for q in picked if q]
+
+    # 4) one bulk insert (write-behind)
+    record_seen_many(user_id, planned)
+
+    plan = state.setdefault("plan", [])
+    first = state.get("question_number", 0) + (len(plan) - state.get("plan_cursor", 0)) + 1
+    for k, q in enumerate(planned):
+        q["n"] = first + k
+    plan.extend(planned)
+    return len(planned)
+
+def take_planned(user_id, state):
+    """Next planned question; plans another chunk when the current one is used up."""
+    plan = state.get("plan")
+    if plan is None:
+        return None
 
-            # 🎯 3. Hash & dedupe
-            q_hash = compute_question_hash(q_text)
+    cursor = state.get("plan_cursor", 0)
+    if cursor >= len(plan):
+        remaining = (state.get("total_questions") or 0) - state.get("question_number", 0)
+        if remaining <= 0 or not plan_questions(user_id, state, min(remaining, state.get("plan_chunk", 10))):
+            return None
+
+    q = plan[cursor]
+    state["plan_cursor"] = cursor + 1
+    return q
+
+def planned_payload(q):
+    return {
+        "id": q["n"],
+        "question": q["question"],
+        "answers": q["answers"],
+        "difficulty": q["difficulty"],
+        "category": q["theme"],
+        "source": q["source"]
+    }
 
-            state.setdefault("used_hashes", [])
+# =====================================================
+# PREFETCH (question N+1 prepared while N is answered)
+# =====================================================
+PREFETCH_EXECUTOR = make_executor(max_workers=4)
+PLAN_PAGE_SIZE = 10
+
+def wants_prefetch(state):
+    total = state.get("total_questions")
+    return not total or state.get("question_number", 0) < total
+
+def schedule_prefetch(sid, user_id, state):
+    """Prepare the next question in the background; stored next to the quiz state."""
+    snapshot = {
+        "allowed_themes": state.get("allowed_themes"),
+        "bandit": state.get("bandit"),
+        "theme_stats": state.get("theme_stats", {}),
+        "used_hashes": set(state.get("used_hashes", ()))
+    }
 
-            if q_hash in state["used_hashes"]:
-                continue
+    def task():
+        with app.app_context():
+            q = select_question(user_id, snapshot)
+            if q:
+                # a prefetch nobody took (ex: two in flight) goes back to the pool
+                replaced = QUIZ_STATES.replace_next(sid, q)
+                if replaced:
+                    QUESTION_POOL.push_many([replaced])
+
+    PREFETCH_EXECUTOR.submit(task)
+
+def take_prefetched(sid, state):
+    """The prefetched question, if ready and still unused in this session."""
+    q = QUIZ_STATES.pop_next(sid)
+    if q and short_hash(q["hash"]) in state.get("used_hashes", ()):
+        QUESTION_POOL.push_many([q])  # stale here, still good for other users
+        return None
+    return q
 
-            if UserSeenQuestion.query.filter_by(
-                user_id=user.id,
-                question_hash=q_hash
-            ).first():
-                continue
+@login_required
+@app.route("/api/question")
+def question():
+    user = get_current_user()
+    state = load_quiz_state()
 
-            chosen = (q_text, c, a, d, theme, source, q_hash)
-            break
+    if not state:
+        return jsonify({"error": "Quiz not started"}), 400
 
-        except Exception:
-            continue
+    # Current question not answered yet (ex: already handed out by /api/answer): same one
+    last = state.get("last") or {}
+    if last and last.get("answered") is False:
+        return jsonify(question_payload(state))
 
-    if not chosen:
-        return jsonify({"error": "No question available"}), 200
+    sid = session["quiz_sid"]
 
-    q_text, c, a, d, theme, source, q_hash = chosen
+    # Planned session: already materialized (and recorded as seen)
+    q = take_planned(user.id, state)
+    if q:
+        serve_question(user.id, state, q, persist=False)
+        save_quiz_state(state)
+        return jsonify(question_payload(state))
 
-    # --------------------------------------------------
-    # Persist question
-    # --------------------------------------------------
-    db.session.add(UserSeenQuestion(
-        user_id=user.id,
-        question_hash=q_hash,
-        source=source,
-        theme=theme
-    ))
-    db.session.commit()
+    q = take_prefetched(sid, state) or select_question(user.id, state)
 
-    state["used_hashes"].append(q_hash)
-    state["question_number"] = state.get("question_number", 0) + 1
+    if not q:
+        return jsonify({"error": "No question available"}), 200
 
-    state["last"] = {
-        "question": q_text,
-        "correct": c,
-        "answers": a,
-        "difficulty": d,
-        "theme": theme,   # ✅ Trickia theme ONLY
-        "source": source
-    }
+    serve_question(user.id, state, q)
+    save_quiz_state(state)
 
-    session["quiz_state"] = state
-    session.modified = True
+    if wants_prefetch(state) and "plan" not in state:
+        schedule_prefetch(sid, user.id, state)
 
-    return jsonify({
-        "id": state["question_number"],
-        "question": q_text,
-        "answers": a,
-        "difficulty": d,
-        "category": theme,
-        "source": source
-    })
+    return jsonify(question_payload(state))
 
 # =====================================================
 # ANSWER - FIXED (NO MORE KeyError)
@@ -418,7 +1031,11 @@ def question():
 @login_required
 @app.route("/api/answer", methods=["POST"])
 def answer():
-    state = session.get("quiz_state")
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Authentication required"}), 401
+
+    state = load_quiz_state()
     if not state:
         return jsonify({"error": "Quiz not started"}), 400
 
@@ -429,7 +1046,15 @@ def answer():
     data = request.get_json(silent=True) or {}
     user_answer = data.get("answer")
 
+    # A retried / double-submitted POST must not score question N against N+1
+    # (already handed out as "next") nor answer the same question twice
+    if data.get("question_id") is None:
+        return jsonify({"error": "question_id required"}), 400
+    if data["question_id"] != state.get("question_number") or last.get("answered"):
+        return jsonify({"error": "Question already answered or not the current one"}), 409
+
     is_correct = (user_answer == last["correct"])
+    last["answered"] = True
 
     # -----------------------------
     # THEME STATS (SESSION)
@@ -457,6 +1082,19 @@ def answer():
     else:
         state["current_streak"] = 0
 
+    # -----------------------------
+    # 🎰 THEME x DIFFICULTY ARM (memory now, DB write-behind)
+    # -----------------------------
+    if last.get("difficulty") in DIFFICULTIES:
+        ARM_WRITER.add(ARM_STORE.update(user.id, theme, last["difficulty"], is_correct))
+
+    # -----------------------------
+    # 🧾 ANSWER EVENT (append-only log, written behind)
+    # -----------------------------
+    ANSWER_WRITER.add(answer_event(
+        user.id, session_key(session.get("quiz_sid")), state, last, is_correct
+    ))
+
     # -----------------------------
     # 📊 API STATS (SESSION)
     # -----------------------------
@@ -473,115 +1111,166 @@ def answer():
             state["api_stats"][source]["correct"] += 1
 
     # -----------------------------
-    # SAVE SESSION
+    # NEXT QUESTION (prefetched while this one was answered)
     # -----------------------------
-    session["quiz_state"] = state
-    session.modified = True
-
-    return jsonify({
+    result = {
         "status": "success" if is_correct else "fail",
         "correct": last["correct"],
         "score": state["score"]
-    })
+    }
+
+    sid = session["quiz_sid"]
+    if "plan" in state:
+        nxt = take_planned(user.id, state) if wants_prefetch(state) else None
+        if nxt:
+            serve_question(user.id, state, nxt, persist=False)
+            result["next"] = question_payload(state)
+    elif wants_prefetch(state):
+        nxt = take_prefetched(sid, state)
+        if nxt:
+            serve_question(user.id, state, nxt)
+            result["next"] = question_payload(state)
+            if wants_prefetch(state):
+                schedule_prefetch(sid, user.id, state)
+
+    # -----------------------------
+    # SAVE SESSION
+    # -----------------------------
+    save_quiz_state(state)
+
+    return jsonify(result)
 
 # =====================================================
 # END SESSION (3B) + keep persistence of theme stats (3A)
 # =====================================================
+SESSION_RESULT_TTL = timedelta(days=1)  # fenêtre de rejeu des clés d'idempotence
+
+def session_summary(state, theme_stats):
+    themes = [
+        {
+            "theme": theme,
+            "correct": s["correct"],
+            "total": s["total"],
+            "percent": round(100 * s["correct"] / s["total"], 1)
+        } for theme, s in theme_stats.items()
+    ]
+    answered = sum(t["total"] for t in themes)
+    start = state.get("start_time")
+    return {
+        "score": state.get("score", 0),
+        "answered": answered,
+        "total_questions": state.get("total_questions") or answered,
+        "percent": round(100 * state.get("score", 0) / answered, 1) if answered else 0,
+        "best_streak": state.get("best_streak", 0),
+        "duration_seconds": int((datetime.utcnow() - start).total_seconds()) if start else None,
+        "themes": themes
+    }
+
+def replay_session_result(row):
+    response = Response(row.response, mimetype="application/json")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
 @app.route("/api/session/end", methods=["POST"])
 @login_required
 def end_session():
+    """
+    Finalize the session from the server-held quiz_state (the client sends no stats).
+    Idempotent: the same Idempotency-Key (header or body, default: the quiz session
+    id) replays the first response instead of counting the session twice. The claim
+    also records the quiz session: a second key for the same session gets the
+    first result, never a second finalization.
+    """
     user = get_current_user()
-    data = request.json or {}
-
-    theme_stats = data.get("theme_stats", {})
-    best_streak_session = data.get("best_streak", 0)
+    data = request.get_json(silent=True) or {}
+    key = (request.headers.get("Idempotency-Key") or data.get("idempotency_key") or session.get("quiz_sid") or "")[:100]
+    if not key:
+        return jsonify({"status": "no_stats"}), 200
+    sid = session_key(session.get("quiz_sid"))
+
+    def stored_result():
+        row = db.session.get(SessionResult, (user.id, key))
+        if (row is None or not row.response) and sid:
+            row = SessionResult.query.filter_by(user_id=user.id, sid=sid).first()
+        return row if row is not None and row.response else None
+
+    stored = stored_result()
+    if stored is not None:
+        return replay_session_result(stored)
+
+    state = load_quiz_state() or {}
+    theme_stats = {
+        t: s for t, s in state.get("theme_stats", {}).items()
+        if s.get("total", 0) > 0
+    }
 
     # 🔐 Sécurité : rien à enregistrer
-    if not isinstance(theme_stats, dict) or not theme_stats:
+    if not theme_stats:
         return jsonify({"status": "no_stats"}), 200
 
-    for theme, stats in theme_stats.items():
-        total = stats.get("total", 0)
-        correct = stats.get("correct", 0)
-
-        # 🚫 Ignore thèmes sans vraies questions
-        if total <= 0:
-            continue
-
-        entry = UserThemeStats.query.filter_by(
-            user_id=user.id,
-            theme=theme
-        ).first()
-
-        if not entry:
-            entry = UserThemeStats(
-                user_id=user.id,
-                theme=theme,
-                total_questions=0,
-                correct_answers=0,
-                best_streak=0
-            )
-            db.session.add(entry)
-
-        # 📊 Update stats
-        entry.total_questions += total
-        entry.correct_answers += correct
-        entry.best_streak = max(entry.best_streak, best_streak_session)
-        entry.last_played = datetime.utcnow()
-
-        # 🏆 ACHIEVEMENT: Expert in <theme> (SESSION-BASED ONLY)
-        accuracy = correct / total if total > 0 else 0
-
-        # 🎯 Conditions strictes
-        if total >= 2 and accuracy >= 0.85:
-            label = f"Expert in {theme}!"
-
-            achievement = UserAchievement.query.filter_by(
-                user_id=user.id,
-                label=label
-            ).first()
-
-            if achievement:
-                # ➕ Badge déjà existant → on incrémente
-                achievement.count += 1
-            else:
-                # 🆕 Nouveau badge réellement gagné
-                db.session.add(
-                    UserAchievement(
-                        user_id=user.id,
-                        label=label,
-                        count=1
-                    )
-                )
-        # step = dernier step + 1
-    last = (
-        UserThemeBanditSnapshot.query
-        .filter_by(user_id=user.id)
-        .order_by(UserThemeBanditSnapshot.step.desc())
-        .first()
-    )
-    step = (last.step + 1) if last else 1
-
-    from services.bandit import ensure_bandit_state
-
-    # Initialiser le bandit pour tous les thèmes (prior neutre)
-    for theme in get_all_trickia_themes():
-        ensure_bandit_state(db, UserThemeBanditState, user.id, theme)
+    # Seen rows durable first (own transaction, before this request takes the
+    # write lock), so SEEN_FILTERS.save covers them in its last_row_id
+    SEEN_WRITER.flush()
+
+    # Claim the key *and* the session (unique sid): first writer wins, a concurrent
+    # retry (same key or another one) replays its result
+    claim = sqlite_insert(SessionResult.__table__).values(
+        user_id=user.id, key=key, sid=sid, created_at=datetime.utcnow()
+    ).on_conflict_do_nothing()
+    if db.session.execute(claim).rowcount == 0:
+        db.session.rollback()
+        stored = stored_result()
+        if stored is not None:
+            return replay_session_result(stored)
+        return jsonify({"status": "in_progress"}), 409
 
     DISCOUNT = 0.85  # paramètre de récence
 
-    update_bandit_for_session(
-        db=db,
-        ModelState=UserThemeBanditState,
-        ModelSnap=UserThemeBanditSnapshot,
+    # Stats + badges + bandit + snapshots: one query per table, bulk upserts, one commit
+    results = persist_session_results(
+        db,
         user_id=user.id,
         theme_stats=theme_stats,
+        best_streak=state.get("best_streak", 0),
+        themes=get_all_trickia_themes(),
         discount=DISCOUNT,
-        step=step
+        StatsModel=UserThemeStats,
+        AchievementModel=UserAchievement,
+        StateModel=UserThemeBanditState,
+        SnapModel=UserThemeBanditSnapshot,
+        cache=BANDIT_CACHE
     )
-
+    profile = refresh_profile_summary(db, user.id, user.username, UserProfileSummary, UserThemeStats, UserAchievement)
+
+    # Summary + badges + updated profile: everything the end screen needs, one response
+    body = json.dumps({
+        "status": "ok",
+        "step": results["step"],
+        "summary": session_summary(state, theme_stats),
+        "badges": results["badges"],
+        "profile": profile
+    }, separators=(",", ":"))
+
+    SessionResult.query.filter_by(user_id=user.id, key=key).update({"response": body})
+    SessionResult.query.filter(
+        SessionResult.user_id == user.id,
+        SessionResult.created_at < datetime.utcnow() - SESSION_RESULT_TTL
+    ).delete()
+
+    SEEN_FILTERS.save(user.id)
     db.session.commit()
-    return jsonify({"status": "ok"})
+
+    # 🏅 Leaderboards : mise à jour incrémentale (pas de scan)
+    LEADERBOARDS.record(user.id, {t["theme"]: t for t in profile["themes"]})
+
+    PREDICTOR.invalidate(user.id)
+
+    # Session over: make its per-answer arm updates and events durable now
+    ARM_WRITER.flush()
+    ANSWER_WRITER.flush()
+    discard_quiz_state(session.get("quiz_sid"))
+
+    return Response(body, mimetype="application/json")
 
 # =====================================================
 # STATS (SESSION)
@@ -589,7 +1278,7 @@ def end_session():
 @login_required
 @app.route("/api/stats")
 def stats():
-    state = session.get("quiz_state", {})
+    state = load_quiz_state() or {}
     result = []
     for theme, s in state.get("theme_stats", {}).items():
         pct = round(100 * s["correct"] / s["total"], 1) if s["total"] else 0
@@ -607,7 +1296,7 @@ def stats():
 @login_required
 @app.route("/api/api_stats")
 def api_stats():
-    state = session.get("quiz_state", {})
+    state = load_quiz_state() or {}
     api_stats = state.get("api_stats", {})
 
     result = []
@@ -634,44 +1323,57 @@ def api_stats():
 def api_profile():
     user = get_current_user()
 
-    # --- THEME STATS ---
-    theme_entries = UserThemeStats.query.filter_by(user_id=user.id).all()
+    # Résumé matérialisé (1 lecture par clé), construit à la volée pour les anciens comptes
+    summary = db.session.get(UserProfileSummary, user.id)
+    if summary is None:
+        refresh_profile_summary(db, user.id, user.username, UserProfileSummary, UserThemeStats, UserAchievement)
+        db.session.commit()
+        summary = db.session.get(UserProfileSummary, user.id)
 
-    themes = []
-    total_questions = 0
-    best_streak_global = 0
+    # ETag + Last-Modified : une revisite sans nouvelle session => 304 sans corps
+    response = Response(summary.data, mimetype="application/json")
+    response.set_etag(f"{user.id}-{summary.version}")
+    response.last_modified = summary.updated_at
+    response.cache_control.private = True
+    response.cache_control.no_cache = True  # toujours revalider
+    return response.make_conditional(request)
 
-    for entry in theme_entries:
-        total = entry.total_questions
-        correct = entry.correct_answers
-        percent = round((correct / total) * 100, 1) if total > 0 else 0
+@app.route("/api/leaderboard")
+@login_required
+def api_leaderboard():
+    user = get_current_user()
+    metric = request.args.get("metric", "accuracy")
+    theme = request.args.get("theme") or None
+    limit = max(1, min(request.args.get("limit", 10, type=int), 100))
 
-        themes.append({
-            "theme": entry.theme,
-            "total": total,
-            "correct": correct,
-            "percent": percent
-        })
+    if metric not in METRICS:
+        return jsonify({"error": f"metric must be one of {', '.join(METRICS)}"}), 400
+    if theme is not None and not is_valid_trickia_theme(theme):
+        return jsonify({"error": "unknown theme"}), 400
+
+    top = LEADERBOARDS.top(metric, limit, theme)
+    rank, score, size = LEADERBOARDS.rank(metric, user.id, theme)
 
-        total_questions += total
-        best_streak_global = max(best_streak_global, entry.best_streak)
+    names = dict(
+        db.session.query(User.id, User.username)
+        .filter(User.id.in_([uid for _, uid, _ in top]))
+        .all()
+    )
 
-    # --- ACHIEVEMENTS ---
-    achievements = UserAchievement.query.filter_by(user_id=user.id).all()
+    def fmt(value):
+        return round(100 * value, 1) if metric == "accuracy" else value
 
     return jsonify({
-    "username": user.username,
-    "total_questions": total_questions,
-    "best_streak": best_streak_global,
-    "themes": themes,
-    "achievements": [
-        {
-            "label": a.label,
-            "count": a.count,
-            "unlocked_at": a.unlocked_at.isoformat()
-        } for a in achievements
-    ]
-})
+        "metric": metric,
+        "theme": theme,
+        "size": size,
+        "min_questions": app.config["LEADERBOARD_MIN_QUESTIONS"] if metric == "accuracy" else None,
+        "top": [
+            {"rank": r, "username": names.get(uid), "score": fmt(sc), "me": uid == user.id}
+            for r, uid, sc in top
+        ],
+        "me": {"rank": rank, "score": fmt(score)} if rank is not None else None
+    })
 
 @app.route("/api/model/state")
 @login_required
@@ -738,15 +1440,114 @@ def api_model_history():
             "mean": round(snap.mean, 4)
         })
 
+    # Payload borné : LTTB côté serveur (0 = tout)
+    max_points = request.args.get("max_points", app.config["MODEL_HISTORY_MAX_POINTS"], type=int)
+    if max_points:
+        result = {theme: lttb(points, max_points) for theme, points in result.items()}
+
     return jsonify({"themes": result})
 
+@app.route("/api/providers/health")
+@login_required
+def providers_health():
+    return jsonify({
+        **{
+            name: {**h.snapshot(), "weight": round(PROVIDER_ROUTER.weight(name), 3)}
+            for name, h in PROVIDER_HEALTH.items()
+        },
+        "question_source": app.config["QUESTION_SOURCE"]
+    })
+
 @app.route("/api/themes")
 @login_required
 def get_themes():
     return jsonify(get_all_trickia_themes())
 
+# =====================================================
+# 🧹 RETENTION (flask --app app compact-snapshots)
+# =====================================================
+@app.cli.command("compact-snapshots")
+@click.option("--user-id", type=int, default=None, help="Only this user (default: everyone).")
+@click.option("--keep-recent", type=int, default=KEEP_RECENT_STEPS, show_default=True)
+@click.option("--bucket-size", type=int, default=BUCKET_SIZE, show_default=True)
+def compact_snapshots_command(user_id, keep_recent, bucket_size):
+    """Downsample old bandit snapshots into bucket averages."""
+    removed = compact_snapshots(db, UserThemeBanditSnapshot, user_id, keep_recent, bucket_size)
+    db.session.commit()
+    click.echo(f"{removed} snapshot rows compacted")
+
+@app.cli.command("purge-quiz-states")
+def purge_quiz_states_command():
+    """Delete server-held quiz states of sessions never ended (older than QUIZ_STATE_TTL)."""
+    count = SQLiteStore(db, QuizSessionState, ttl=app.config["QUIZ_STATE_TTL"]).purge()
+    click.echo(f"{count} abandoned quiz states deleted")
+
+@app.cli.command("export-answers")
+@click.option("--out", default=None, help="Output directory (default: ANSWER_EXPORT_DIR).")
+@click.option("--since", default=None, help="First day, YYYY-MM-DD.")
+@click.option("--until", default=None, help="Last day, YYYY-MM-DD.")
+@click.option("--format", "fmt", type=click.Choice(["parquet", "npz"]), default=None,
+              help="Default: parquet when a Parquet engine is installed, else npz.")
+def export_answers_command(out, since, until, fmt):
+    """Export the answer event log to one columnar file per day."""
+    if fmt == "parquet" and not parquet_available():
+        raise click.ClickException("Parquet needs pyarrow or fastparquet (pip install pyarrow), or use --format npz")
+    ANSWER_WRITER.flush()
+    paths = export_columnar(ANSWER_LOG, out or app.config["ANSWER_EXPORT_DIR"], since, until, fmt)
+    click.echo(f"{len(paths)} day(s) exported")
+
+@app.cli.command("import-legacy-stats")
+@click.option("--path", default=os.path.join("data", "user_stats.json"), show_default=True)
+@click.option("--user-id", type=int, default=None, help="Owner of the legacy answers (unknown by default).")
+def import_legacy_stats_command(path, user_id):
+    """Stream the old data/user_stats.json into the answer event log."""
+    count = import_legacy_stats(path, ANSWER_LOG, user_id=user_id)
+    click.echo(f"{count} legacy answers imported")
+
+@app.cli.command("import-questions")
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--encoding", type=click.Choice(sorted(DECODERS)), default="html", show_default=True,
+              help="OpenTDB text encoding of the dump (encode= parameter used to fetch it).")
+@click.option("--batch-size", default=1000, show_default=True)
+def import_questions_command(paths, encoding, batch_size):
+    """Bank provider-native JSONL dumps (OpenTDB / TheTriviaAPI) for offline serving."""
+    before = Question.query.count()
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            report = import_question_dump(
+                f, partial(store_questions, db, Question), make_pooled_question,
+                encoding=encoding, batch_size=batch_size
+            )
+        skipped = ", ".join(f"{reason}={n}" for reason, n in report["skipped"].most_common()) or "none"
+        click.echo(f"{path}: {report['read']} read, {sum(report['themes'].values())} parsed, skipped: {skipped}")
+        for theme, n in sorted(report["themes"].items()):
+            click.echo(f"  {theme:<20}{n:>8}")
+    click.echo(f"{Question.query.count() - before} new questions in the bank")
+
+@app.cli.command("train-model")
+@click.option("--full", is_flag=True, help="Ignore the watermark and retrain from scratch.")
+@click.option("--legacy", default=os.path.join("data", "user_stats.json"), show_default=True,
+              help="Legacy answers file ('' to skip).")
+def train_model_command(full, legacy):
+    """Incremental training of the P(correct) model from the answer event log (ml/train.py)."""
+    from ml.train import train
+
+    ANSWER_WRITER.flush()
+    train(events_dir=app.config["ANSWER_EVENTS_DIR"], legacy_path=legacy, full=full, log=click.echo)
+
+@app.cli.command("upgrade-db")
+def upgrade_db_command():
+    """Bring an existing database up to date (columns, indexes, FTS, WAL). Idempotent."""
+    db.create_all()
+    ensure_indexes(db)
+    ensure_fulltext_index(db)
+    for name, value in current_pragmas(db).items():
+        click.echo(f"{name} = {value}")
+
 with app.app_context():
     db.create_all()
+    ensure_indexes(db)
+    ensure_fulltext_index(db)
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,165 @@
+# bench/fake_trivia.py
+"""
+Local stand-in for OpenTriviaDB (/api.php) and TheTriviaAPI (/v2/questions).
+
+Same response shapes as the real APIs, fresh question texts on every call,
+with configurable latency and failure rates so the provider layer (retries,
+circuit breakers, pool refills) can be exercised offline:
+
+    python bench/fake_trivia.py --port 8765 --latency-ms 80 --error-rate 0.05
+
+then start the app with OPENTDB_BASE_URL / TRIVIAAPI_BASE_URL pointing at it.
+bench/load_test.py starts one in-process automatically.
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DIFFICULTIES = ("easy", "medium", "hard")
+
+
+class FakeTrivia:
+    def __init__(self, latency_ms=50.0, jitter_ms=20.0, error_rate=0.0, rate_limit_rate=0.0, seed=None):
+        """
+        error_rate      : share of calls answered with HTTP 500 (retryable)
+        rate_limit_rate : share of calls throttled (OpenTDB response_code 5, TheTriviaAPI HTTP 429)
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+
+        self.calls = {"opentdb": 0, "triviaapi": 0, "errors": 0, "rate_limited": 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+
+    # --------------------------------------------------
+    # PAYLOADS
+    # --------------------------------------------------
+    def _question_id(self):
+        with self._lock:
+            return next(self._ids)
+
+    def opentdb(self, params):
+        amount = min(int(params.get("amount", 10)), 50)
+        return {
+            "response_code": 0,
+            "results": [
+                {
+                    "type": "multiple",
+                    "difficulty": params.get("difficulty") or self.random.choice(DIFFICULTIES),
+                    "category": "General Knowledge",
+                    "question": f"OpenTDB question #{self._question_id()} &amp; friends?",
+                    "correct_answer": "Right",
+                    "incorrect_answers": ["Wrong 1", "Wrong 2", "Wrong 3"],
+                } for _ in range(amount)
+            ],
+        }
+
+    def triviaapi(self, params):
+        limit = min(int(params.get("limit", 10)), 50)
+        difficulties = (params.get("difficulties") or "").split(",")
+        difficulties = [d for d in difficulties if d in DIFFICULTIES] or list(DIFFICULTIES)
+        categories = (params.get("categories") or "general_knowledge").split(",")
+        return [
+            {
+                "id": f"fake-{self._question_id()}",
+                "category": categories[0],
+                "tags": categories,
+                "difficulty": self.random.choice(difficulties),
+                "question": {"text": f"TheTriviaAPI question #{self._question_id()}?"},
+                "correctAnswer": "Right",
+                "incorrectAnswers": ["Wrong 1", "Wrong 2", "Wrong 3"],
+                "type": "text_choice",
+            } for _ in range(limit)
+        ]
+
+    # --------------------------------------------------
+    # HTTP
+    # --------------------------------------------------
+    def handle(self, path, params):
+        """Returns (status, payload)."""
+        delay = max(0.0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms))
+        time.sleep(delay / 1000)
+
+        api = "opentdb" if path == "/api.php" else "triviaapi" if path == "/v2/questions" else None
+        if api is None:
+            return 404, {"error": "not found"}
+
+        roll = self.random.random()
+        with self._lock:
+            self.calls[api] += 1
+            if roll < self.error_rate:
+                self.calls["errors"] += 1
+            elif roll < self.error_rate + self.rate_limit_rate:
+                self.calls["rate_limited"] += 1
+
+        if roll < self.error_rate:
+            return 500, {"error": "fake failure"}
+        if roll < self.error_rate + self.rate_limit_rate:
+            return (200, {"response_code": 5, "results": []}) if api == "opentdb" else (429, {"error": "slow down"})
+        return 200, self.opentdb(params) if api == "opentdb" else self.triviaapi(params)
+
+    def start(self, host="127.0.0.1", port=0):
+        """Serve in a daemon thread; returns the base URL."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real hosts
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                status, payload = fake.handle(url.path, params)
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if status == 429:
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-trivia", daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeTrivia(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate)
+    print(f"fake trivia APIs on {fake.start(args.host, args.port)} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# bench/load_test.py
+"""
+Offline load test: simulated users against the app, fake trivia APIs upstream.
+
+Starts bench/fake_trivia.py in-process, points the app at it and at a fresh
+SQLite file, then runs `--users` concurrent users, each playing `--sessions`
+sessions of `--questions` questions:
+
+    register -> /api/session/start -> (/api/question -> /api/answer) x N -> /api/session/end
+
+like static/script.js does (the question returned in /api/answer's "next" is
+used directly). Reports throughput, p50/p95/p99 per endpoint, SQL statements
+per request and upstream calls:
+
+    python bench/load_test.py --users 20 --questions 20 --latency-ms 80 --error-rate 0.05
+
+--offline skips the fake APIs: a corpus of `--corpus` questions per theme is
+generated in both providers' native shapes, imported like
+`flask import-questions` does, and the app runs with QUESTION_SOURCE=bank
+(no network at all, every run starts from the same bank):
+
+    python bench/load_test.py --offline --corpus 300 --users 20
+
+Requests go through Flask's test client (no HTTP server in front), so the
+numbers are the app's own handling time.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.fake_trivia import FakeTrivia  # noqa: E402
+
+
+class Recorder:
+    """Latencies and SQL statements per endpoint (statements of background threads: "background")."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statements = defaultdict(int)
+        self.errors = defaultdict(int)
+        self._current = threading.local()
+        self._lock = threading.Lock()
+
+    def on_statement(self, *args, **kwargs):
+        endpoint = getattr(self._current, "endpoint", None) or "background"
+        with self._lock:
+            self.statements[endpoint] += 1
+
+    def call(self, endpoint, fn, *args, **kwargs):
+        self._current.endpoint = endpoint
+        started = time.perf_counter()
+        try:
+            response = fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._current.endpoint = None
+        with self._lock:
+            self.latencies[endpoint].append(elapsed)
+            if response.status_code >= 400:
+                self.errors[endpoint] += 1
+        return response
+
+
+def play_user(app, recorder, user_no, sessions, questions, themes):
+    client = app.test_client()
+    username = f"bench-{user_no}-{random.randrange(10 ** 9)}"
+    recorder.call("register", client.post, "/register", data={"username": username, "password": "bench"})
+
+    for _ in range(sessions):
+        chosen = random.sample(themes, min(len(themes), random.randint(2, 5)))
+        recorder.call("session/start", client.post, "/api/session/start",
+                      json={"themes": chosen, "total_questions": questions})
+
+        nxt = None
+        for _ in range(questions):
+            if nxt is None:
+                q = recorder.call("question", client.get, "/api/question").get_json() or {}
+            else:
+                q = nxt
+            if "answers" not in q:
+                break
+            r = recorder.call("answer", client.post, "/api/answer",
+                              json={"question_id": q["id"], "answer": random.choice(q["answers"])})
+            nxt = (r.get_json() or {}).get("next")
+
+        recorder.call("session/end", client.post, "/api/session/end", json={},
+                      headers={"Idempotency-Key": f"{username}-{time.monotonic_ns()}"})
+
+
+def write_corpus(fake, path, per_theme):
+    """JSONL dump in the providers' native shapes: half OpenTDB results, half TheTriviaAPI questions."""
+    from services.themes import OPENTDB_CATEGORY_NAMES, TRICKIA_THEMES
+
+    with open(path, "w", encoding="utf-8") as f:
+        for theme, providers in TRICKIA_THEMES.items():
+            for n in range(per_theme):
+                if n % 2 == 0:
+                    item = fake.opentdb({"amount": 1})["results"][0]
+                    item["category"] = OPENTDB_CATEGORY_NAMES[providers["opentdb"][n // 2 % len(providers["opentdb"])]]
+                else:
+                    item = fake.triviaapi({"limit": 1, "categories": ",".join(providers["triviaapi"])})[0]
+                f.write(json.dumps(item) + "\n")
+
+
+def percentile(sorted_values, p):
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method="inclusive")[p - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--sessions", type=int, default=1, help="sessions per user")
+    parser.add_argument("--questions", type=int, default=20, help="questions per session")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fake API latency")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake API calls failing (HTTP 500)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of fake API calls throttled")
+    parser.add_argument("--db", default=None, help="SQLite file (default: a fresh temporary one)")
+    parser.add_argument("--offline", action="store_true", help="serve from an imported bank only (QUESTION_SOURCE=bank)")
+    parser.add_argument("--corpus", type=int, default=300, help="--offline: questions per theme in the generated dump")
+    args = parser.parse_args()
+
+    fake = FakeTrivia(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, seed=0)
+    workdir = tempfile.mkdtemp(prefix="trickia-load-")
+
+    # the app reads its configuration at import time
+    db_path = args.db or os.path.join(workdir, "load.db")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.abspath(db_path)
+    # answer events too: the default (data/events) is relative to the launch directory
+    os.environ["ANSWER_EVENTS_DIR"] = os.path.join(workdir, "events")
+    if args.offline:
+        os.environ["QUESTION_SOURCE"] = "bank"
+        # unroutable: any provider call would show up as an error, not as traffic
+        os.environ["OPENTDB_BASE_URL"] = os.environ["TRIVIAAPI_BASE_URL"] = "http://127.0.0.1:9"
+    else:
+        base_url = fake.start()
+        os.environ["OPENTDB_BASE_URL"] = base_url
+        os.environ["TRIVIAAPI_BASE_URL"] = base_url
+
+    from sqlalchemy import event
+    import app as trickia
+
+    if args.offline:
+        corpus = os.path.join(workdir, "corpus.jsonl")
+        write_corpus(fake, corpus, args.corpus)
+        with trickia.app.app_context(), open(corpus, encoding="utf-8") as f:
+            report = trickia.import_question_dump(
+                f, partial(trickia.store_questions, trickia.db, trickia.Question), trickia.make_pooled_question
+            )
+        print(f"offline bank: {report['stored']} questions imported from {corpus}")
+
+    recorder = Recorder()
+    with trickia.app.app_context():
+        event.listen(trickia.db.engine, "before_cursor_execute", recorder.on_statement)
+    themes = trickia.get_all_trickia_themes()
+
+    started = time.perf_counter()
+    users = [
+        threading.Thread(target=play_user, args=(trickia.app, recorder, n, args.sessions, args.questions, themes))
+        for n in range(args.users)
+    ]
+    for u in users:
+        u.start()
+    for u in users:
+        u.join()
+    elapsed = time.perf_counter() - started
+
+    total_requests = sum(len(v) for v in recorder.latencies.values())
+    print(f"{args.users} users x {args.sessions} session(s) x {args.questions} questions in {elapsed:.2f}s")
+    print(f"throughput: {total_requests / elapsed:.1f} req/s, {args.users * args.sessions / elapsed:.2f} sessions/s")
+    print(f"upstream calls: {fake.calls}" + (" (offline: bank only)" if args.offline else ""))
+    print()
+    print(f"{'endpoint':<16}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'SQL/req':>9}")
+    for endpoint, values in recorder.latencies.items():
+        values = sorted(values)
+        print(
+            f"{endpoint:<16}{len(values):>7}{recorder.errors[endpoint]:>8}"
+            f"{1000 * percentile(values, 50):>10.2f}{1000 * percentile(values, 95):>10.2f}"
+            f"{1000 * percentile(values, 99):>10.2f}{recorder.statements[endpoint] / len(values):>9.1f}"
+        )
+    print(f"{'background':<16}{'':>7}{'':>8}{'':>10}{'':>10}{'':>10}{recorder.statements['background']:>9} total")
+
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# bench/sqlite_write_bench.py
+"""
+Write throughput of the SQLite profiles under concurrent quiz sessions.
+
+Each worker thread plays sessions the way the app hits the database:
+- per question: read the quiz state row, INSERT OR IGNORE one UserSeenQuestion
+  and commit, then save the quiz state (upsert + commit)
+- per session end: stats upserts + snapshot inserts in one transaction
+
+Run on a throwaway file, once with the SQLite defaults (rollback journal) and
+once with the production profile (services/sqlite_profile.py):
+
+    python bench/sqlite_write_bench.py --threads 16 --seconds 10
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.sqlite_profile import PRODUCTION_PRAGMAS, apply_pragmas  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE user_seen_question (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, question_hash VARCHAR(64) NOT NULL,
+    source VARCHAR(30), theme VARCHAR(50), first_seen DATETIME, last_seen DATETIME,
+    CONSTRAINT uq_user_question UNIQUE (user_id, question_hash)
+);
+CREATE TABLE user_theme_stats (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, theme VARCHAR(50) NOT NULL,
+    total_questions INTEGER, correct_answers INTEGER, best_streak INTEGER, last_played DATETIME,
+    CONSTRAINT user_theme_unique UNIQUE (user_id, theme)
+);
+CREATE TABLE user_theme_bandit_snapshot (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, theme VARCHAR(50) NOT NULL,
+    step INTEGER NOT NULL, mean FLOAT NOT NULL, alpha FLOAT NOT NULL, beta FLOAT NOT NULL, created_at DATETIME
+);
+CREATE TABLE quiz_session_state (id VARCHAR(64) PRIMARY KEY, user_id INTEGER, data BLOB NOT NULL, updated_at DATETIME);
+"""
+
+INDEXES = """
+CREATE INDEX ix_user_seen_user_theme ON user_seen_question (user_id, theme);
+CREATE INDEX ix_snapshot_user_theme_step ON user_theme_bandit_snapshot (user_id, theme, step);
+"""
+
+THEMES = ["Science", "History", "Geography", "Sports", "Music", "Movies"]
+
+
+def connect(path, profile):
+    # the app's pysqlite connections: default 5 s lock timeout, autocommit off
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+    if profile == "production":
+        apply_pragmas(conn, PRODUCTION_PRAGMAS)
+    return conn
+
+
+def play(path, profile, user_id, deadline, questions, out):
+    conn = connect(path, profile)
+    latencies, errors, commits = [], 0, 0
+    while time.monotonic() < deadline:
+        sid = uuid.uuid4().hex
+        for _ in range(questions):
+            started = time.monotonic()
+            try:
+                conn.execute("SELECT data FROM quiz_session_state WHERE id = ?", (sid,)).fetchone()
+                conn.execute(
+                    "INSERT OR IGNORE INTO user_seen_question (user_id, question_hash, source, theme, first_seen, last_seen) "
+                    "VALUES (?, ?, 'bench', ?, datetime('now'), datetime('now'))",
+                    (user_id, uuid.uuid4().hex + uuid.uuid4().hex, random.choice(THEMES))
+                )
+                conn.commit()
+                conn.execute(
+                    "INSERT INTO quiz_session_state (id, user_id, data, updated_at) VALUES (?, ?, ?, datetime('now')) "
+                    "ON CONFLICT (id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    (sid, user_id, os.urandom(600))
+                )
+                conn.commit()
+                commits += 2
+            except sqlite3.OperationalError:
+                conn.rollback()
+                errors += 1
+            latencies.append(time.monotonic() - started)
+
+        started = time.monotonic()
+        try:
+            for theme in THEMES:
+                conn.execute(
+                    "INSERT INTO user_theme_stats (user_id, theme, total_questions, correct_answers, best_streak, last_played) "
+                    "VALUES (?, ?, 3, 2, 2, datetime('now')) ON CONFLICT (user_id, theme) DO UPDATE SET "
+                    "total_questions = total_questions + excluded.total_questions, "
+                    "correct_answers = correct_answers + excluded.correct_answers",
+                    (user_id, theme)
+                )
+                conn.execute(
+                    "INSERT INTO user_theme_bandit_snapshot (user_id, theme, step, mean, alpha, beta, created_at) "
+                    "VALUES (?, ?, 1, 0.5, 1, 1, datetime('now'))",
+                    (user_id, theme)
+                )
+            conn.commit()
+            commits += 1
+        except sqlite3.OperationalError:
+            conn.rollback()
+            errors += 1
+        latencies.append(time.monotonic() - started)
+    conn.close()
+    out.append((latencies, errors, commits))
+
+
+def run(profile, threads, seconds, questions):
+    directory = tempfile.mkdtemp(prefix="trickia-bench-")
+    path = os.path.join(directory, "bench.db")
+    setup = connect(path, profile)
+    setup.executescript(SCHEMA + INDEXES)
+    setup.close()
+
+    out = []
+    deadline = time.monotonic() + seconds
+    workers = [
+        threading.Thread(target=play, args=(path, profile, uid, deadline, questions, out))
+        for uid in range(1, threads + 1)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    latencies = sorted(l for lat, _, _ in out for l in lat)
+    errors = sum(e for _, e, _ in out)
+    commits = sum(c for _, _, c in out)
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        "profile": profile,
+        "commits/s": round(commits / seconds, 1),
+        "ops": len(latencies),
+        "locked errors": errors,
+        "p50 ms": round(1000 * q[49], 2),
+        "p95 ms": round(1000 * q[94], 2),
+        "p99 ms": round(1000 * q[98], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16, help="concurrent sessions")
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration per profile")
+    parser.add_argument("--questions", type=int, default=20, help="questions per session")
+    parser.add_argument("--profile", choices=["default", "production", "both"], default="both")
+    args = parser.parse_args()
+
+    profiles = ["default", "production"] if args.profile == "both" else [args.profile]
+    for profile in profiles:
+        result = run(profile, args.threads, args.seconds, args.questions)
+        print("  ".join(f"{k}: {v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
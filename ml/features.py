@@ -1 +1,161 @@
-# extraction des features
\ No newline at end of file
+# extraction des features
+"""
+Feature vectors for P(correct | user, theme, difficulty, source).
+
+Serving (ml/predictor.py) and training (ml/train.py) build the exact same
+columns from the same counters:
+- per user      : lifetime answers / correct (all themes)
+- per theme     : the user's answers / correct on the theme (UserThemeStats)
+- per arm       : the user's (theme, difficulty) Beta arm, alpha = 1 + correct,
+                  beta = 1 + wrong (UserThemeDifficultyArm)
+- the candidate : difficulty and source one-hots
+
+Accuracies are Laplace-smoothed ((correct + 1) / (total + 2)), counts are log1p.
+"""
+
+import numpy as np
+
+from services.themes import get_all_trickia_themes
+
+THEMES = get_all_trickia_themes()
+DIFFICULTIES = ("easy", "medium", "hard")
+SOURCES = ("OpenTriviaDB", "TheTriviaAPI")
+
+THEME_INDEX = {t: i for i, t in enumerate(THEMES)}
+DIFFICULTY_INDEX = {d: i for i, d in enumerate(DIFFICULTIES)}
+SOURCE_INDEX = {s: i for i, s in enumerate(SOURCES)}
+
+FEATURE_NAMES = (
+    "user_accuracy", "user_log_answers",
+    "theme_accuracy", "theme_log_answers",
+    "arm_accuracy", "arm_log_answers",
+    "difficulty_easy", "difficulty_medium", "difficulty_hard",
+    "source_opentdb", "source_triviaapi",
+)
+N_FEATURES = len(FEATURE_NAMES)
+
+
+def smoothed(correct, total):
+    return (np.asarray(correct, dtype=float) + 1.0) / (np.asarray(total, dtype=float) + 2.0)
+
+
+class UserFeatures:
+    """One user's counters as arrays; candidate rows are gathered from them."""
+
+    def __init__(self, theme_total, theme_correct, arm_total, arm_correct):
+        self.theme_total = np.asarray(theme_total, dtype=float)     # (n_themes,)
+        self.theme_correct = np.asarray(theme_correct, dtype=float)
+        self.arm_total = np.asarray(arm_total, dtype=float)         # (n_themes, 3)
+        self.arm_correct = np.asarray(arm_correct, dtype=float)
+
+        total, correct = self.theme_total.sum(), self.theme_correct.sum()
+        self.user = np.array([smoothed(correct, total), np.log1p(total)])
+        self.theme = np.column_stack([smoothed(self.theme_correct, self.theme_total), np.log1p(self.theme_total)])
+        self.arm = np.stack([smoothed(self.arm_correct, self.arm_total), np.log1p(self.arm_total)], axis=-1)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(len(THEMES)), np.zeros(len(THEMES)),
+                   np.zeros((len(THEMES), 3)), np.zeros((len(THEMES), 3)))
+
+    @classmethod
+    def from_counts(cls, theme_counts, arms):
+        """
+        theme_counts: {theme: (total, correct)}
+        arms: {(theme, difficulty): (alpha, beta)} with the (1, 1) prior included
+        """
+        uf = cls.empty()
+        theme_total, theme_correct = uf.theme_total, uf.theme_correct
+        arm_total, arm_correct = uf.arm_total, uf.arm_correct
+        for theme, (total, correct) in theme_counts.items():
+            i = THEME_INDEX.get(theme)
+            if i is not None:
+                theme_total[i], theme_correct[i] = total, correct
+        for (theme, difficulty), (alpha, beta) in arms.items():
+            i, j = THEME_INDEX.get(theme), DIFFICULTY_INDEX.get(difficulty)
+            if i is not None and j is not None:
+                arm_total[i, j] = max(0.0, alpha + beta - 2.0)
+                arm_correct[i, j] = max(0.0, alpha - 1.0)
+        return cls(theme_total, theme_correct, arm_total, arm_correct)
+
+
+def encode_candidates(candidates):
+    """[(theme, difficulty, source)] -> index arrays (-1 = unknown)."""
+    theme_idx = np.array([THEME_INDEX.get(t, -1) for t, _, _ in candidates], dtype=np.intp)
+    diff_idx = np.array([DIFFICULTY_INDEX.get(d, -1) for _, d, _ in candidates], dtype=np.intp)
+    source_idx = np.array([SOURCE_INDEX.get(s, -1) for _, _, s in candidates], dtype=np.intp)
+    return theme_idx, diff_idx, source_idx
+
+
+def candidate_matrix(uf: UserFeatures, theme_idx, diff_idx, source_idx):
+    """(n, N_FEATURES) feature matrix, gathered in a few vectorized steps."""
+    n = len(theme_idx)
+    X = np.zeros((n, N_FEATURES))
+    X[:, 0:2] = uf.user
+
+    known_theme = theme_idx >= 0
+    known_arm = known_theme & (diff_idx >= 0)
+    X[:, 2:4] = np.where(known_theme[:, None], uf.theme[theme_idx], [0.5, 0.0])
+    X[:, 4:6] = np.where(known_arm[:, None], uf.arm[theme_idx, diff_idx], [0.5, 0.0])
+
+    rows = np.arange(n)
+    X[rows[diff_idx >= 0], 6 + diff_idx[diff_idx >= 0]] = 1.0
+    X[rows[source_idx >= 0], 9 + source_idx[source_idx >= 0]] = 1.0
+    return X
+
+
+class RunningFeatures:
+    """
+    Training side: replays answers in time order, keeping every user's counters,
+    so each answer is featurized with what was known *before* it (no leakage).
+    """
+
+    def __init__(self):
+        self._users = {}  # user -> (theme_total, theme_correct, arm_total, arm_correct)
+
+    def _counters(self, user):
+        c = self._users.get(user)
+        if c is None:
+            c = (np.zeros(len(THEMES)), np.zeros(len(THEMES)),
+                 np.zeros((len(THEMES), 3)), np.zeros((len(THEMES), 3)))
+            self._users[user] = c
+        return c
+
+    def featurize(self, events):
+        """
+        events: iterable of dicts with user_id, theme, difficulty, source, correct
+        (time ordered). Returns (X, y) and advances the counters.
+        """
+        rows, labels = [], []
+        for e in events:
+            theme_total, theme_correct, arm_total, arm_correct = self._counters(e.get("user_id"))
+            i = THEME_INDEX.get(e.get("theme"), -1)
+            j = DIFFICULTY_INDEX.get(e.get("difficulty"), -1)
+            s = SOURCE_INDEX.get(e.get("source"), -1)
+
+            total, correct = theme_total.sum(), theme_correct.sum()
+            row = np.zeros(N_FEATURES)
+            row[0:2] = smoothed(correct, total), np.log1p(total)
+            row[2:4] = (smoothed(theme_correct[i], theme_total[i]), np.log1p(theme_total[i])) if i >= 0 else (0.5, 0.0)
+            row[4:6] = (
+                (smoothed(arm_correct[i, j], arm_total[i, j]), np.log1p(arm_total[i, j]))
+                if i >= 0 and j >= 0 else (0.5, 0.0)
+            )
+            if j >= 0:
+                row[6 + j] = 1.0
+            if s >= 0:
+                row[9 + s] = 1.0
+            rows.append(row)
+
+            ok = 1.0 if e.get("correct") else 0.0
+            labels.append(ok)
+            if i >= 0:
+                theme_total[i] += 1
+                theme_correct[i] += ok
+                if j >= 0:
+                    arm_total[i, j] += 1
+                    arm_correct[i, j] += ok
+
+        if not rows:
+            return np.zeros((0, N_FEATURES)), np.zeros(0)
+        return np.vstack(rows), np.asarray(labels)
@@ -1 +1,152 @@
-  # interface pour prédire difficulté
\ No newline at end of file
+# interface pour prédire difficulté
+"""
+Batched P(correct) predictor.
+
+- the artifact (ml/model.pkl, written by ml/train.py) is loaded lazily, once
+  per process, and re-checked every `reload_seconds`: a new version swapped in
+  with os.replace is picked up without a restart, and a broken or missing file
+  keeps the current model (or leaves the predictor "not ready")
+- an artifact is only used when its stored holdout log loss beats the
+  base-rate guess: otherwise the app keeps the plain pool pick
+- a user's feature arrays are cached (LRU) and invalidated at session end
+- predict() scores a whole batch of (theme, difficulty, source) candidates
+  with one gather + one matrix-vector product (no per-candidate Python work
+  besides encoding the labels)
+
+The artifact only holds NumPy arrays (logistic coefficients + metadata), so
+loading it never imports scikit-learn on the serving path.
+"""
+
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from ml.features import FEATURE_NAMES, UserFeatures, candidate_matrix, encode_candidates
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model.pkl")
+ARTIFACT_FORMAT = 2  # 2: holdout metrics stored with the weights
+
+
+def load_artifact(path):
+    """The artifact dict, or None if the file is missing / not a compatible, validated model."""
+    try:
+        with open(path, "rb") as f:
+            artifact = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+        return None
+    if (
+        not isinstance(artifact, dict)
+        or artifact.get("format") != ARTIFACT_FORMAT
+        or tuple(artifact.get("feature_names", ())) != FEATURE_NAMES
+    ):
+        return None
+    if not beats_baseline(artifact.get("metrics")):
+        return None
+    return artifact
+
+
+def beats_baseline(metrics) -> bool:
+    """Holdout log loss lower than the constant base-rate guess (ml/train.py validation)."""
+    try:
+        return float(metrics["log_loss"]) < float(metrics["baseline_log_loss"])
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+class Predictor:
+    def __init__(self, path=DEFAULT_MODEL_PATH, reload_seconds=60.0, max_users=10000, user_ttl=300.0):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.max_users = max_users
+        self.user_ttl = user_ttl
+
+        self._coef = None          # (N_FEATURES,)
+        self._intercept = 0.0
+        self._version = None
+        self._mtime = None
+        self._checked_at = None
+        self._users = OrderedDict()  # user_id -> (UserFeatures, loaded_at)
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------
+    # MODEL (lazy, hot-swappable)
+    # --------------------------------------------------
+    def _refresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.reload_seconds:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.reload_seconds:
+                return
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                return
+            if mtime == self._mtime:
+                return
+            self._mtime = mtime
+            artifact = load_artifact(self.path)
+            if artifact is None:
+                return  # keep serving the current model (if any)
+            self._coef = np.asarray(artifact["coef"], dtype=float).ravel()
+            self._intercept = float(artifact["intercept"])
+            self._version = artifact.get("version")
+
+    @property
+    def ready(self) -> bool:
+        self._refresh()
+        return self._coef is not None
+
+    @property
+    def version(self):
+        self._refresh()
+        return self._version
+
+    # --------------------------------------------------
+    # USER FEATURES (cached)
+    # --------------------------------------------------
+    def user_features(self, user_id, loader) -> UserFeatures:
+        """loader() -> UserFeatures, only called on a cache miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry and now - entry[1] < self.user_ttl:
+                self._users.move_to_end(user_id)
+                return entry[0]
+
+        uf = loader()
+        with self._lock:
+            self._users[user_id] = (uf, now)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return uf
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    # --------------------------------------------------
+    # PREDICT / RANK
+    # --------------------------------------------------
+    def predict(self, uf: UserFeatures, candidates) -> np.ndarray:
+        """P(correct) for every (theme, difficulty, source) candidate, in one call."""
+        if not self.ready or not candidates:
+            return np.full(len(candidates), np.nan)
+        X = candidate_matrix(uf, *encode_candidates(candidates))
+        return 1.0 / (1.0 + np.exp(-(X @ self._coef + self._intercept)))
+
+    def rank(self, uf: UserFeatures, candidates, target: float) -> np.ndarray:
+        """
+        Candidate indexes, closest predicted success to `target` first. Stable:
+        ties keep the caller's order (ex: the bandit's theme ranking).
+        """
+        p = self.predict(uf, candidates)
+        if np.isnan(p).all():
+            return np.arange(len(candidates))
+        return np.argsort(np.abs(p - target), kind="stable")
@@ -1 +1,353 @@
-# script d'entraînement
\ No newline at end of file
+# script d'entraînement
+"""
+Incremental training of the P(correct) model.
+
+Sources (per-answer labels):
+- the answer event log (services/answer_events.py, data/events/date=*/events-*.jsonl)
+- the legacy data/user_stats.json, streamed once (events imported from it with
+  `flask import-legacy-stats` have a "legacy-*" session and are skipped here,
+  so the file is never counted twice)
+
+Bounded memory and incremental:
+- files are read in chunks of `chunk_size` lines; each chunk is featurized
+  (ml.features.RunningFeatures: each answer sees only what came before it)
+- every HOLDOUT_EVERY-th answer is held out (reservoir of at most HOLDOUT_MAX
+  rows); the others are standardized by a running StandardScaler and fed to
+  SGDClassifier.partial_fit, `epochs` shuffled passes per chunk, constant
+  small learning rate
+- a watermark (byte offset per event file, legacy file signature) is kept in
+  ml/train_state.pkl with the estimator, the scaler, the holdout and the running
+  counters: the next run only reads what was appended since. Memory grows with
+  the number of users (a few hundred floats each), not with the history.
+
+Validation: the candidate's log loss on the holdout is compared with the
+base-rate guess and with the currently served model on the same rows. The
+served model is only replaced when the candidate beats both; the metrics are
+stored in the artifact (the Predictor refuses artifacts that don't beat the
+baseline).
+
+Outputs (each written to a temp file, then os.replace):
+- ml/train_state.pkl                  : estimator + scaler + holdout + watermark (training only)
+- ml/artifacts/model-<version>.pkl    : versioned artifact (last `keep` kept)
+- ml/model.pkl                        : the served artifact, replaced atomically; the
+                                        app's Predictor picks it up on its next check
+
+    python -m ml.train [--events data/events] [--legacy data/user_stats.json] [--full]
+"""
+
+import argparse
+import json
+import os
+import pickle
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from ml.features import FEATURE_NAMES, N_FEATURES, RunningFeatures
+from ml.predictor import ARTIFACT_FORMAT, DEFAULT_MODEL_PATH, load_artifact
+from services.answer_events import iter_json_array
+from services.themes import theme_for_category
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STATE_PATH = os.path.join(ML_DIR, "train_state.pkl")
+DEFAULT_ARTIFACTS_DIR = os.path.join(ML_DIR, "artifacts")
+DEFAULT_EVENTS_DIR = os.path.join("data", "events")
+DEFAULT_LEGACY_PATH = os.path.join("data", "user_stats.json")
+
+STATE_FORMAT = 2
+HOLDOUT_EVERY = 5      # every 5th answer is validation only, never fitted
+HOLDOUT_MAX = 20000    # reservoir size (rows kept in the train state)
+MIN_HOLDOUT = 100      # fewer held-out rows: no validation, no swap
+EPOCHS = 5
+
+
+# --------------------------------------------------
+# STATE
+# --------------------------------------------------
+def new_state():
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    return {
+        "format": STATE_FORMAT,
+        "model": SGDClassifier(loss="log_loss", alpha=1e-3, learning_rate="constant", eta0=0.01,
+                               random_state=0),
+        "scaler": StandardScaler(),
+        "fitted": False,
+        "features": RunningFeatures(),
+        "offsets": {},       # event file (relative to the events dir) -> bytes consumed
+        "legacy": None,      # (size, mtime) of the legacy file once trained on
+        "answers": 0,        # featurized answers (fitted + held out): drives the split
+        "rows": 0,           # fitted rows
+        "positives": 0,      # correct answers among the fitted rows (base rate)
+        "holdout_X": np.zeros((0, N_FEATURES)),
+        "holdout_y": np.zeros(0),
+        "holdout_seen": 0,
+        "rng": np.random.default_rng(0),
+        "version": 0,
+    }
+
+
+def load_state(path):
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return new_state()
+    if not isinstance(state, dict) or state.get("format") != STATE_FORMAT:
+        return new_state()  # older layout: retrain from scratch
+    return state
+
+
+def atomic_dump(obj, path):
+    """Pickle to a temp file in the same directory, then os.replace (readers see old or new)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".pkl")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+# --------------------------------------------------
+# SOURCES (chunked)
+# --------------------------------------------------
+def event_files(events_dir):
+    if not os.path.isdir(events_dir):
+        return []
+    files = []
+    for day in sorted(d for d in os.listdir(events_dir) if d.startswith("date=")):
+        for name in sorted(os.listdir(os.path.join(events_dir, day))):
+            if name.endswith(".jsonl"):
+                files.append(os.path.join(day, name))
+    return files
+
+
+def read_new_events(events_dir, offsets, chunk_size):
+    """
+    Yield lists of at most `chunk_size` events appended since `offsets`, and
+    advance `offsets` as chunks are consumed. A trailing line without "\\n" (a
+    flush in progress) is left for the next run.
+    """
+    chunk = []
+    for rel in event_files(events_dir):
+        path = os.path.join(events_dir, rel)
+        with open(path, "rb") as f:
+            f.seek(offsets.get(rel, 0))
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offsets[rel] = offsets.get(rel, 0) + len(line)
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if str(event.get("session") or "").startswith("legacy-"):
+                    continue  # trained from the legacy file itself
+                chunk.append(event)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def read_legacy(path, chunk_size):
+    """data/user_stats.json as event dicts, in chunks (streamed, never fully loaded)."""
+    chunk = []
+    with open(path, encoding="utf-8") as f:
+        for entry in iter_json_array(f):
+            chunk.append({
+                "user_id": None,
+                "theme": theme_for_category(entry.get("category")),
+                "difficulty": entry.get("difficulty"),
+                "source": entry.get("source"),
+                "correct": bool(entry.get("correct")),
+            })
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+# --------------------------------------------------
+# TRAIN
+# --------------------------------------------------
+def add_holdout(state, X, y):
+    """Reservoir sampling: the holdout stays a uniform sample of every held-out answer."""
+    rng = state["rng"]
+    keep_X, keep_y = list(state["holdout_X"]), list(state["holdout_y"])
+    for row, label in zip(X, y):
+        state["holdout_seen"] += 1
+        if len(keep_y) < HOLDOUT_MAX:
+            keep_X.append(row)
+            keep_y.append(label)
+        else:
+            j = rng.integers(state["holdout_seen"])
+            if j < HOLDOUT_MAX:
+                keep_X[j], keep_y[j] = row, label
+    state["holdout_X"] = np.asarray(keep_X, dtype=float).reshape(-1, N_FEATURES)
+    state["holdout_y"] = np.asarray(keep_y, dtype=float)
+
+
+def fit_chunk(state, events, epochs=EPOCHS):
+    X, y = state["features"].featurize(events)
+    if not len(y):
+        return 0
+
+    held = (np.arange(state["answers"], state["answers"] + len(y)) % HOLDOUT_EVERY) == 0
+    state["answers"] += len(y)
+    add_holdout(state, X[held], y[held])
+    X, y = X[~held], y[~held]
+    if not len(y):
+        return 0
+
+    # counts (log1p) and accuracies on one scale: no exploding weights
+    state["scaler"].partial_fit(X)
+    X = state["scaler"].transform(X)
+    for _ in range(epochs):
+        order = state["rng"].permutation(len(y))
+        state["model"].partial_fit(X[order], y[order], classes=np.array([0.0, 1.0]))
+
+    state["fitted"] = True
+    state["rows"] += len(y)
+    state["positives"] += int(y.sum())
+    return len(y)
+
+
+def served_coefficients(state):
+    """Scaler folded into the weights: the artifact scores raw feature rows."""
+    scaler = state["scaler"]
+    coef = np.asarray(state["model"].coef_, dtype=float).ravel() / scaler.scale_
+    intercept = float(np.ravel(state["model"].intercept_)[0] - coef @ scaler.mean_)
+    return coef, intercept
+
+
+def log_loss(p, y):
+    p = np.clip(p, 1e-6, 1 - 1e-6)
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+
+def holdout_loss(coef, intercept, state):
+    X, y = state["holdout_X"], state["holdout_y"]
+    return log_loss(1.0 / (1.0 + np.exp(-(X @ coef + intercept))), y)
+
+
+def validate(state, coef, intercept, model_path):
+    """Holdout metrics of the candidate, the base-rate guess and the served model (None if absent)."""
+    y = state["holdout_y"]
+    base_rate = state["positives"] / state["rows"] if state["rows"] else 0.5
+    served = load_artifact(model_path)
+    return {
+        "holdout_rows": int(len(y)),
+        "log_loss": holdout_loss(coef, intercept, state),
+        "baseline_log_loss": log_loss(np.full(len(y), base_rate), y),
+        "served_log_loss": holdout_loss(np.asarray(served["coef"], dtype=float), served["intercept"], state)
+        if served else None,
+    }
+
+
+def export_artifact(state, version, model_path, artifacts_dir, coef, intercept, metrics, keep=5):
+    """Versioned artifact + atomic swap of the served model."""
+    artifact = {
+        "format": ARTIFACT_FORMAT,
+        "version": version,
+        "feature_names": list(FEATURE_NAMES),
+        "coef": coef,
+        "intercept": intercept,
+        "metrics": {k: v for k, v in metrics.items() if k != "served_log_loss"},
+        "trained_rows": state["rows"],
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+    atomic_dump(artifact, os.path.join(artifacts_dir, f"model-{version}.pkl"))
+    atomic_dump(artifact, model_path)
+
+    old = sorted(n for n in os.listdir(artifacts_dir) if n.startswith("model-") and n.endswith(".pkl"))
+    for name in old[:-keep] if keep else []:
+        os.remove(os.path.join(artifacts_dir, name))
+
+
+def train(events_dir=DEFAULT_EVENTS_DIR, legacy_path=DEFAULT_LEGACY_PATH, state_path=DEFAULT_STATE_PATH,
+          model_path=DEFAULT_MODEL_PATH, artifacts_dir=DEFAULT_ARTIFACTS_DIR, chunk_size=5000, full=False, log=print,
+          epochs=EPOCHS):
+    started = time.monotonic()
+    state = load_state(state_path)
+    if full:
+        state = {**new_state(), "version": state["version"]}  # versions keep increasing
+    new_rows = 0
+
+    # legacy file first (it predates the event log), once per file version
+    if legacy_path and os.path.exists(legacy_path):
+        signature = (os.path.getsize(legacy_path), os.path.getmtime(legacy_path))
+        if state["legacy"] != signature:
+            for events in read_legacy(legacy_path, chunk_size):
+                new_rows += fit_chunk(state, events, epochs)
+            state["legacy"] = signature
+
+    for events in read_new_events(events_dir, state["offsets"], chunk_size):
+        new_rows += fit_chunk(state, events, epochs)
+
+    if not new_rows:
+        log("no new answers since the last run: model unchanged")
+        return None
+    if not state["fitted"]:
+        return None
+
+    # state first: a crash before the swap keeps serving the old model, and
+    # the next run's export includes these rows without re-reading them
+    atomic_dump(state, state_path)
+
+    coef, intercept = served_coefficients(state)
+    metrics = validate(state, coef, intercept, model_path)
+    summary = (
+        f"holdout {metrics['holdout_rows']} rows: log loss {metrics['log_loss']:.4f}, "
+        f"base rate {metrics['baseline_log_loss']:.4f}"
+        + (f", served model {metrics['served_log_loss']:.4f}" if metrics["served_log_loss"] is not None else "")
+    )
+    if metrics["holdout_rows"] < MIN_HOLDOUT:
+        log(f"{new_rows} new answers, {summary}: too few held-out answers to validate, model unchanged")
+        return None
+    if metrics["log_loss"] >= metrics["baseline_log_loss"] or (
+        metrics["served_log_loss"] is not None and metrics["log_loss"] > metrics["served_log_loss"]
+    ):
+        log(f"{new_rows} new answers, {summary}: candidate rejected, model unchanged")
+        return None
+
+    state["version"] += 1
+    version = f"v{state['version']:04d}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+    atomic_dump(state, state_path)
+    export_artifact(state, version, model_path, artifacts_dir, coef, intercept, metrics)
+
+    log(f"{new_rows} new answers ({state['rows']} total), {summary} -> {version} "
+        f"in {time.monotonic() - started:.2f}s")
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", default=DEFAULT_EVENTS_DIR, help="answer event log directory")
+    parser.add_argument("--legacy", default=DEFAULT_LEGACY_PATH, help="legacy user_stats.json ('' to skip)")
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH)
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--artifacts", default=DEFAULT_ARTIFACTS_DIR)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--epochs", type=int, default=EPOCHS, help="shuffled passes over each chunk")
+    parser.add_argument("--full", action="store_true", help="ignore the watermark, retrain from scratch")
+    args = parser.parse_args()
+
+    train(args.events, args.legacy, args.state, args.model, args.artifacts, args.chunk_size, args.full,
+          epochs=args.epochs)
+
+
+if __name__ == "__main__":
+    main()
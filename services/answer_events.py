@@ -0,0 +1,273 @@
+# services/answer_events.py
+"""
+Append-only answer event store, partitioned by day.
+
+/api/answer queues one event per answer on a WriteBehindBuffer; each flush
+appends the batch as JSON lines to
+
+    <root>/date=YYYY-MM-DD/events-<pid>.jsonl
+
+(one file per process and day: workers never interleave writes, a day is
+dropped by removing its directory). Events are never updated; analytics and
+model training read these files, or their columnar export, never the OLTP
+tables.
+
+export_columnar() turns each day into one columnar file: Parquet when pandas
+has a Parquet engine (pyarrow / fastparquet), NumPy .npz otherwise.
+iter_columnar() reads them back day by day, as DataFrames.
+import_legacy_stats() streams the old data/user_stats.json array into the store.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from services.themes import theme_for_category
+
+# ts: epoch seconds (UTC); correct: 0/1; response_ms: serve -> answer (None if unknown)
+EVENT_FIELDS = (
+    "ts", "user_id", "session", "question_number", "question_hash",
+    "theme", "difficulty", "source", "correct", "response_ms",
+)
+
+
+def day_of(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+# --------------------------------------------------
+# WRITE
+# --------------------------------------------------
+class AnswerEventLog:
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def partition(self, day: str) -> str:
+        return os.path.join(self.root, f"date={day}")
+
+    def append_many(self, events):
+        """Flush function for the write-behind buffer: one append per day touched."""
+        by_day = {}
+        for e in events:
+            by_day.setdefault(day_of(e["ts"]), []).append(e)
+
+        with self._lock:
+            for day, batch in by_day.items():
+                directory = self.partition(day)
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f"events-{os.getpid()}.jsonl")
+                lines = "".join(
+                    json.dumps({k: e.get(k) for k in EVENT_FIELDS}, separators=(",", ":")) + "\n"
+                    for e in batch
+                )
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+
+    # --------------------------------------------------
+    # READ
+    # --------------------------------------------------
+    def days(self, since=None, until=None):
+        """Partition days (YYYY-MM-DD, inclusive bounds), oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        days = sorted(
+            name[len("date="):] for name in os.listdir(self.root)
+            if name.startswith("date=")
+        )
+        return [d for d in days if (not since or d >= since) and (not until or d <= until)]
+
+    def iter_events(self, since=None, until=None):
+        """Stream every event, day by day (one line in memory at a time)."""
+        for day in self.days(since, until):
+            directory = self.partition(day)
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith(".jsonl"):
+                    continue
+                with open(os.path.join(directory, name), encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            yield json.loads(line)
+
+    def read_day(self, day) -> pd.DataFrame:
+        directory = self.partition(day)
+        frames = [
+            pd.read_json(os.path.join(directory, name), lines=True, dtype=False)
+            for name in sorted(os.listdir(directory))
+            if name.endswith(".jsonl") and os.path.getsize(os.path.join(directory, name))
+        ]
+        if not frames:
+            return pd.DataFrame(columns=list(EVENT_FIELDS))
+        return pd.concat(frames, ignore_index=True).reindex(columns=list(EVENT_FIELDS))
+
+
+# --------------------------------------------------
+# COLUMNAR EXPORT
+# --------------------------------------------------
+def parquet_available() -> bool:
+    for engine in ("pyarrow", "fastparquet"):
+        try:
+            __import__(engine)
+            return True
+        except ImportError:
+            continue
+    return False
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df["ts"] = df["ts"].astype("float64")
+    df["user_id"] = pd.to_numeric(df["user_id"], errors="coerce").fillna(-1).astype("int64")
+    df["question_number"] = pd.to_numeric(df["question_number"], errors="coerce").fillna(0).astype("int32")
+    df["correct"] = df["correct"].astype(bool).astype("int8")
+    df["response_ms"] = pd.to_numeric(df["response_ms"], errors="coerce").astype("float64")  # NaN = unknown
+    for col in ("session", "question_hash", "theme", "difficulty", "source"):
+        df[col] = df[col].fillna("").astype(str)
+    return df
+
+
+def export_columnar(log: AnswerEventLog, out_dir, since=None, until=None, fmt=None):
+    """
+    One file per day: <out_dir>/date=YYYY-MM-DD.parquet (or .npz).
+    Days already exported are rewritten (today keeps growing). Returns the paths.
+    """
+    fmt = fmt or ("parquet" if parquet_available() else "npz")
+    os.makedirs(out_dir, exist_ok=True)
+
+    paths = []
+    for day in log.days(since, until):
+        df = _typed(log.read_day(day))
+        path = os.path.join(out_dir, f"date={day}.{fmt}")
+        tmp = path + ".tmp"
+        if fmt == "parquet":
+            df.to_parquet(tmp, index=False)
+        else:
+            with open(tmp, "wb") as f:
+                # strings as fixed-width unicode arrays: loadable without pickle
+                np.savez_compressed(f, **{
+                    col: df[col].to_numpy(dtype=str if df[col].dtype == object else None)
+                    for col in EVENT_FIELDS
+                })
+        os.replace(tmp, path)  # readers never see a half-written day
+        paths.append(path)
+    return paths
+
+
+def iter_columnar(out_dir, since=None, until=None):
+    """Yield (day, DataFrame) for each exported day, oldest first."""
+    if not os.path.isdir(out_dir):
+        return
+    for name in sorted(os.listdir(out_dir)):
+        if not name.startswith("date=") or name.endswith(".tmp"):
+            continue
+        day, ext = name[len("date="):].split(".", 1)
+        if (since and day < since) or (until and day > until):
+            continue
+        path = os.path.join(out_dir, name)
+        if ext == "parquet":
+            yield day, pd.read_parquet(path)
+        elif ext == "npz":
+            with np.load(path, allow_pickle=False) as arrays:
+                yield day, pd.DataFrame({col: arrays[col] for col in arrays.files})
+
+
+# --------------------------------------------------
+# LEGACY IMPORT (data/user_stats.json)
+# --------------------------------------------------
+def iter_json_array(f, chunk_size=1 << 16):
+    """
+    Stream the objects of a top-level JSON array without loading the file.
+    (Elements must be objects/arrays: a number cut at a chunk boundary would
+    otherwise decode as a shorter one.)
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, started, eof = "", 0, False, False
+
+    while not eof:
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf):
+                break
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                break  # element cut by the chunk boundary: read more
+            yield obj
+            pos = end
+
+
+def import_legacy_stats(path, log: AnswerEventLog, user_id=None, ts=None, batch_size=1000):
+    """
+    Replay data/user_stats.json into the event store. The old file has no
+    timestamps nor users: events get `ts` (default: the file's mtime) and
+    `user_id`; question_id restarting at 1 marks a new session.
+    Returns the number of events written.
+    """
+    ts = ts if ts is not None else os.path.getmtime(path)
+    written, session_no, batch = 0, 0, []
+
+    with open(path, encoding="utf-8") as f:
+        for entry in iter_json_array(f):
+            number = int(entry.get("question_id") or 0)
+            if number <= 1:
+                session_no += 1
+            batch.append({
+                "ts": ts,
+                "user_id": user_id,
+                "session": f"legacy-{session_no}",
+                "question_number": number,
+                "question_hash": None,
+                "theme": theme_for_category(entry.get("category")) or entry.get("category"),
+                "difficulty": entry.get("difficulty"),
+                "source": entry.get("source") or "legacy",
+                "correct": bool(entry.get("correct")),
+                "response_ms": None,
+            })
+            if len(batch) >= batch_size:
+                log.append_many(batch)
+                written += len(batch)
+                batch = []
+
+    if batch:
+        log.append_many(batch)
+        written += len(batch)
+    return written
+
+
+def answer_event(user_id, session_id, state, last, correct):
+    """Event for one /api/answer call (last = the question just answered)."""
+    served_at = last.get("served_at")
+    now = time.time()
+    return {
+        "ts": now,
+        "user_id": user_id,
+        "session": session_id,
+        "question_number": state.get("question_number"),
+        "question_hash": last.get("hash"),
+        "theme": last.get("theme"),
+        "difficulty": last.get("difficulty"),
+        "source": last.get("source"),
+        "correct": bool(correct),
+        "response_ms": round(1000 * (now - served_at)) if served_at else None,
+    }
@@ -1,85 +1,264 @@
-import random
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
 def beta_mean(alpha: float, beta: float) -> float:
     denom = alpha + beta
     return (alpha / denom) if denom > 0 else 0.5
 
-def ensure_bandit_state(db, ModelState, user_id: int, theme: str):
-    row = ModelState.query.filter_by(user_id=user_id, theme=theme).first()
-    if row:
-        return row
-    row = ModelState(user_id=user_id, theme=theme, alpha=1.0, beta=1.0)
-    db.session.add(row)
-    db.session.commit()
-    return row
+def discounted_update(alpha: float, beta: float, correct: int, total: int, discount: float):
+    """Récence par discount exponentiel (simple et efficace)."""
+    wrong = total - correct
+    return discount * alpha + correct, discount * beta + wrong
+
 
-def update_bandit_for_session(db, ModelState, ModelSnap, user_id: int, theme_stats: dict, discount: float, step: int):
+# --------------------------------------------------
+# CACHE DES SCORES (hors chemin chaud)
+# --------------------------------------------------
+def bandit_version(db, ModelState, user_id: int) -> str:
     """
-    theme_stats: {theme: {"total": int, "correct": int}}
-    discount: 0.0..1.0 (ex: 0.85) => plus petit = plus de récence
-    step: numéro de session (pour snapshots)
+    Cheap cross-process version of a user's bandit rows (max updated_at + row count):
+    changes whenever persist_session_results (services/session_persistence.py) writes.
     """
-    for theme, s in theme_stats.items():
-        total = int(s.get("total", 0))
-        correct = int(s.get("correct", 0))
-        if total <= 0:
-            continue
-        wrong = total - correct
-
-        state = ensure_bandit_state(db, ModelState, user_id, theme)
-
-        # Récence par discount exponentiel (simple et efficace)
-        state.alpha = discount * state.alpha + correct
-        state.beta  = discount * state.beta  + wrong
-        state.updated_at = datetime.utcnow()
-
-        mean = beta_mean(state.alpha, state.beta)
-
-        db.session.add(ModelSnap(
-            user_id=user_id,
-            theme=theme,
-            step=step,
-            mean=mean,
-            alpha=state.alpha,
-            beta=state.beta
-        ))
+    last, count = (
+        db.session.query(func.max(ModelState.updated_at), func.count(ModelState.id))
+        .filter(ModelState.user_id == user_id)
+        .one()
+    )
+    return f"{last.isoformat() if last else '-'}:{count}"
 
-    db.session.commit()
 
-def make_relative_buckets(themes, theme_to_score):
+class BanditCache:
+    """
+    Per-process LRU: user_id -> (version, {theme: (alpha, beta)}).
+    A hit costs one aggregate query (version check), a miss one full read.
+    Invalidated locally by persist_session_results; other processes see the
+    new version at their next lookup.
+    """
+
+    def __init__(self, max_users=10000):
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def params(self, db, ModelState, user_id: int) -> dict:
+        """{theme: (alpha, beta)}"""
+        version = bandit_version(db, ModelState, user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+
+        rows = ModelState.query.filter_by(user_id=user_id).all()
+        params = {r.theme: (r.alpha, r.beta) for r in rows}
+
+        with self._lock:
+            self._entries[user_id] = (version, params)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return params
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+# --------------------------------------------------
+# THOMPSON SAMPLING (vectorisé)
+# --------------------------------------------------
+BUCKETS = ("strong", "mid", "weak")
+BUCKET_PROBS = np.array([0.50, 0.30, 0.20])   # strong / mid / weak
+DIFFICULTIES = ("easy", "medium", "hard")
+
+_rng = np.random.default_rng()
+
+
+class ThompsonSelector:
     """
-    themes: list[str]
-    theme_to_score: dict[str] -> float (0..1)
-    retourne: (weak, mid, strong)
+    All themes' Beta posteriors as arrays; one vectorized draw ranks every theme.
+
+    - strong bucket: themes ordered by highest sampled success
+    - weak bucket:   lowest sampled success first
+    - mid bucket:    closest to the median draw first
+    Difficulty: without arms, strong -> hard, weak -> easy, mid -> random.
+    With theme x difficulty arms (shape n_themes x 3), it is the arm of the
+    top-ranked theme whose draw is closest to the bucket's target success rate.
     """
-    if not themes:
-        return [], [], []
-
-    ranked = sorted(themes, key=lambda t: theme_to_score.get(t, 0.5))
-    n = len(ranked)
-
-    low_n = max(1, int(round(0.3 * n)))
-    high_n = max(1, int(round(0.3 * n)))
-
-    weak = ranked[:low_n]
-    strong = ranked[-high_n:]
-    mid = [t for t in ranked if t not in weak and t not in strong]
-
-    # si n est petit, mid peut être vide, c'est OK
-    return weak, mid, strong
-
-def choose_bucket():
-    r = random.random()
-    if r < 0.50:
-        return "strong"
-    if r < 0.80:
-        return "mid"
-    return "weak"
-
-def choose_difficulty(bucket: str):
-    if bucket == "strong":
-        return "hard"
-    if bucket == "weak":
-        return "easy"
-    return random.choice(["easy", "medium", "hard"])
+
+    TARGET_SUCCESS = {"strong": 0.55, "mid": 0.70, "weak": 0.85}
+
+    def __init__(self, themes, alpha, beta, arm_alpha=None, arm_beta=None, rng=None):
+        self.themes = list(themes)
+        self.alpha = np.asarray(alpha, dtype=float)
+        self.beta = np.asarray(beta, dtype=float)
+        self.arm_alpha = None if arm_alpha is None else np.asarray(arm_alpha, dtype=float)
+        self.arm_beta = None if arm_beta is None else np.asarray(arm_beta, dtype=float)
+        self.rng = rng or _rng
+
+        n = len(self.themes)
+        edge = max(1, int(round(0.3 * n)))            # ~30% des thèmes en strong / weak, le reste en mid
+        self.bucket_size = {"strong": edge, "weak": edge, "mid": max(1, n - 2 * edge)}
+
+    @classmethod
+    def from_params(cls, themes, params, arms=None, rng=None):
+        """params: {theme: (alpha, beta)}; arms: {(theme, difficulty): (alpha, beta)}"""
+        themes = list(themes)
+        ab = np.array([params.get(t, (1.0, 1.0)) for t in themes], dtype=float).reshape(-1, 2)
+        arm_alpha = arm_beta = None
+        if arms:
+            grid = np.array(
+                [[arms.get((t, d), (1.0, 1.0)) for d in DIFFICULTIES] for t in themes],
+                dtype=float
+            ).reshape(len(themes), len(DIFFICULTIES), 2)
+            arm_alpha, arm_beta = grid[..., 0], grid[..., 1]
+        return cls(themes, ab[:, 0], ab[:, 1], arm_alpha, arm_beta, rng=rng)
+
+    def sample(self, k=1):
+        """(k, n_themes) posterior draws in one call."""
+        return self.rng.beta(self.alpha, self.beta, size=(k, len(self.themes)))
+
+    def plan(self, k, buckets=None):
+        """
+        k picks at once -> list of (themes ordered for the pick, difficulty).
+        buckets: optional list of k bucket names (default: drawn 50/30/20).
+        """
+        if not self.themes or k <= 0:
+            return []
+
+        codes = (
+            np.array([BUCKETS.index(b) for b in buckets])
+            if buckets is not None
+            else self.rng.choice(len(BUCKETS), size=k, p=BUCKET_PROBS)
+        )
+        draws = self.sample(k)
+
+        # une clé de tri par bucket, puis un seul argsort pour toutes les picks
+        median = np.median(draws, axis=1, keepdims=True)
+        keys = np.where(
+            (codes == 0)[:, None], -draws,
+            np.where((codes == 2)[:, None], draws, np.abs(draws - median))
+        )
+        order = np.argsort(keys, axis=1)
+        difficulties = self._difficulties(codes, order[:, 0])
+
+        picks = []
+        for row, code in enumerate(codes):
+            bucket = BUCKETS[code]
+            ranked = order[row, :self.bucket_size[bucket]]
+            picks.append(([self.themes[i] for i in ranked], difficulties[row]))
+        return picks
+
+    def pick(self, bucket=None):
+        return self.plan(1, None if bucket is None else [bucket])[0]
+
+    def _difficulties(self, codes, top_theme):
+        k = len(codes)
+        if self.arm_alpha is None:
+            # strong -> hard, weak -> easy, mid -> random
+            random_mid = self.rng.integers(0, len(DIFFICULTIES), size=k)
+            idx = np.where(codes == 0, 2, np.where(codes == 2, 0, random_mid))
+        else:
+            draws = self.rng.beta(self.arm_alpha[top_theme], self.arm_beta[top_theme])  # (k, 3)
+            targets = np.array([self.TARGET_SUCCESS[b] for b in BUCKETS])[codes]
+            idx = np.argmin(np.abs(draws - targets[:, None]), axis=1)
+        return [DIFFICULTIES[i] for i in idx]
+
+
+# --------------------------------------------------
+# BRAS (THEME x DIFFICULTE), MIS A JOUR A CHAQUE REPONSE
+# --------------------------------------------------
+class ArmStore:
+    """
+    In-memory (theme, difficulty) Beta arms per user, updated at every answer.
+
+    The request thread only touches memory: each update also emits a delta
+    {"user_id", "theme", "difficulty", "correct", "wrong"} for a write-behind
+    buffer (see flush_arm_deltas). Users are loaded lazily (one query) and kept
+    in a per-process LRU.
+    """
+
+    def __init__(self, db, ArmModel, max_users=10000):
+        self.db = db
+        self.ArmModel = ArmModel
+        self.max_users = max_users
+        self._arms = OrderedDict()  # user_id -> {(theme, difficulty): [alpha, beta]}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> dict:
+        """{(theme, difficulty): (alpha, beta)} (copy)"""
+        arms = self._load(user_id)
+        with self._lock:
+            return {k: tuple(v) for k, v in arms.items()}
+
+    def reload(self, user_id: int):
+        """Drop the cached arms (ex: at session start, to see other processes' flushes)."""
+        with self._lock:
+            self._arms.pop(user_id, None)
+
+    def update(self, user_id: int, theme: str, difficulty: str, correct: bool) -> dict:
+        arms = self._load(user_id)
+        with self._lock:
+            ab = arms.setdefault((theme, difficulty), [1.0, 1.0])  # prior neutre
+            ab[0 if correct else 1] += 1.0
+        return {
+            "user_id": user_id,
+            "theme": theme,
+            "difficulty": difficulty,
+            "correct": 1 if correct else 0,
+            "wrong": 0 if correct else 1
+        }
+
+    def _load(self, user_id):
+        with self._lock:
+            arms = self._arms.get(user_id)
+            if arms is not None:
+                self._arms.move_to_end(user_id)
+                return arms
+
+        rows = self.ArmModel.query.filter_by(user_id=user_id).all()
+        loaded = {(r.theme, r.difficulty): [r.alpha, r.beta] for r in rows}
+
+        with self._lock:
+            arms = self._arms.setdefault(user_id, loaded)
+            self._arms.move_to_end(user_id)
+            while len(self._arms) > self.max_users:
+                self._arms.popitem(last=False)
+            return arms
+
+
+def flush_arm_deltas(db, ArmModel, deltas):
+    """
+    Write-behind flush: coalesce deltas per arm, one bulk upsert, one commit.
+    New rows start from the (1, 1) prior; existing rows are incremented in SQL.
+    """
+    merged = {}
+    for d in deltas:
+        key = (d["user_id"], d["theme"], d["difficulty"])
+        c, w = merged.get(key, (0, 0))
+        merged[key] = (c + d["correct"], w + d["wrong"])
+
+    now = datetime.utcnow()
+    rows = [
+        {"user_id": u, "theme": t, "difficulty": diff, "alpha": 1.0 + c, "beta": 1.0 + w, "updated_at": now}
+        for (u, t, diff), (c, w) in merged.items()
+    ]
+
+    table = ArmModel.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "theme", "difficulty"],
+        set_={
+            # excluded = prior + delta -> on retire le prior
+            "alpha": table.c.alpha + stmt.excluded.alpha - 1.0,
+            "beta": table.c.beta + stmt.excluded.beta - 1.0,
+            "updated_at": stmt.excluded.updated_at
+        }
+    )
+    db.session.execute(stmt, rows)
+    db.session.commit()
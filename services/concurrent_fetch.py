@@ -0,0 +1,64 @@
+# services/concurrent_fetch.py
+"""
+Fan-out fetch: several provider calls in parallel, first acceptable question wins.
+
+Worst-case latency is bounded by one timeout instead of the sum of sequential
+retries. Calls still running when a winner is found are not wasted: their results
+(and the non-winning questions of finished calls) go to `on_leftover`, typically
+the question pool.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+def make_executor(max_workers=16):
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="trivia-fetch")
+
+
+def first_accepted(executor, tasks, accept, timeout=6.0, on_leftover=None):
+    """
+    tasks: list of zero-arg callables, each returning list[dict] (pooled questions)
+    accept: (question) -> bool, called in the caller's thread
+    Returns the first accepted question, or None once every task failed / timeout.
+    """
+    pending = {executor.submit(task) for task in tasks}
+    deadline = time.monotonic() + timeout
+    chosen = None
+    leftovers = []
+
+    while pending and chosen is None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for fut in done:
+            try:
+                questions = fut.result()
+            except Exception:
+                continue
+            for q in questions:
+                if chosen is None and accept(q):
+                    chosen = q
+                else:
+                    leftovers.append(q)
+
+    # Cancel what hasn't started; recycle what is already in flight
+    for fut in pending:
+        if not fut.cancel() and on_leftover:
+            fut.add_done_callback(lambda f: _recycle(f, on_leftover))
+
+    if leftovers and on_leftover:
+        on_leftover(leftovers)
+
+    return chosen
+
+
+def _recycle(fut, on_leftover):
+    if fut.cancelled():
+        return
+    try:
+        on_leftover(fut.result())
+    except Exception:
+        pass
@@ -0,0 +1,205 @@
+# services/leaderboard.py
+"""
+Cross-user leaderboards (global and per theme).
+
+Metrics:
+- "accuracy"    : correct / total, only for users with >= min_questions answers
+- "best_streak" : best streak ever
+- "total"       : questions answered
+
+Each (metric, theme) board is a RankIndex: a sorted list of (-score, user_id)
+keys + a user -> key dict. Rank lookups are a bisect (O(log n)), top-N is a
+slice, and end_session updates only the boards that are already in memory
+(delete + insort of one key). A board is built lazily from UserThemeStats with
+one GROUP BY query the first time it's asked for. Once older than `max_age`
+seconds (so other worker processes' sessions show up too) it keeps being
+served while a background thread rebuilds it: the GROUP BY never runs on the
+request path again. Sessions recorded during a rebuild are replayed on the
+new board before it's swapped in.
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from contextlib import nullcontext
+
+from sqlalchemy import func
+
+METRICS = ("accuracy", "best_streak", "total")
+
+
+class RankIndex:
+    def __init__(self, scores=None):
+        """scores: {user_id: score} (higher is better)"""
+        scores = scores or {}
+        self._key = {uid: (-score, uid) for uid, score in scores.items()}
+        self._keys = sorted(self._key.values())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, user_id, score):
+        old = self._key.get(user_id)
+        if old is not None:
+            if old[0] == -score:
+                return
+            del self._keys[bisect_left(self._keys, old)]
+        key = (-score, user_id)
+        self._key[user_id] = key
+        insort(self._keys, key)
+
+    def remove(self, user_id):
+        old = self._key.pop(user_id, None)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, old)]
+
+    def rank(self, user_id):
+        """1-based, ties share the best rank. None if the user isn't ranked."""
+        key = self._key.get(user_id)
+        if key is None:
+            return None
+        return bisect_left(self._keys, (key[0],)) + 1
+
+    def score(self, user_id):
+        key = self._key.get(user_id)
+        return -key[0] if key is not None else None
+
+    def top(self, n):
+        """[(rank, user_id, score)]"""
+        result = []
+        for i, (neg, uid) in enumerate(self._keys[:n]):
+            rank = result[-1][0] if result and result[-1][2] == -neg else i + 1
+            result.append((rank, uid, -neg))
+        return result
+
+
+def metric_score(metric, total, correct, best_streak, min_questions):
+    """Score of one user on one board, or None if not eligible."""
+    if metric == "accuracy":
+        return correct / total if total >= min_questions and total > 0 else None
+    if metric == "best_streak":
+        return best_streak if best_streak > 0 else None
+    return total if total > 0 else None
+
+
+class Leaderboards:
+    def __init__(self, db, StatsModel, min_questions=20, max_age=300.0, app_context=None):
+        """app_context: () -> context manager the background rebuild runs in (Flask app context)."""
+        self.db = db
+        self.StatsModel = StatsModel
+        self.min_questions = min_questions
+        self.max_age = max_age
+        self.app_context = app_context
+
+        self._boards = {}      # (metric, theme|None) -> (RankIndex, built_at)
+        self._rebuilding = {}  # (metric, theme|None) -> [(user_id, totals)] recorded meanwhile
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------
+    # READ
+    # --------------------------------------------------
+    def board(self, metric, theme=None) -> RankIndex:
+        if metric not in METRICS:
+            raise ValueError(f"unknown metric: {metric}")
+        with self._lock:
+            entry = self._boards.get((metric, theme))
+        if entry is None:
+            index = self._build(metric, theme)  # first use in this process only
+            with self._lock:
+                self._boards[(metric, theme)] = (index, time.monotonic())
+            return index
+        if time.monotonic() - entry[1] > self.max_age:
+            self._rebuild_in_background(metric, theme)
+        return entry[0]
+
+    def rank(self, metric, user_id, theme=None):
+        index = self.board(metric, theme)
+        with self._lock:
+            return index.rank(user_id), index.score(user_id), len(index)
+
+    def top(self, metric, n=10, theme=None):
+        index = self.board(metric, theme)
+        with self._lock:
+            return index.top(n)
+
+    # --------------------------------------------------
+    # INCREMENTAL UPDATE (end_session)
+    # --------------------------------------------------
+    def record(self, user_id, theme_totals: dict):
+        """
+        theme_totals: the user's up-to-date lifetime stats for every theme
+        {theme: {"total", "correct", "best_streak"}} (ex: the profile summary).
+        Boards not loaded yet are skipped: they'll be built from the DB.
+        """
+        totals = {
+            None: {
+                "total": sum(s["total"] for s in theme_totals.values()),
+                "correct": sum(s["correct"] for s in theme_totals.values()),
+                "best_streak": max((s["best_streak"] for s in theme_totals.values()), default=0)
+            },
+            **theme_totals
+        }
+        with self._lock:
+            for key, (index, _) in self._boards.items():
+                self._apply(index, key, user_id, totals)
+            for replay in self._rebuilding.values():
+                replay.append((user_id, totals))
+
+    def _apply(self, index, key, user_id, totals):
+        # must be called with self._lock held
+        metric, theme = key
+        s = totals.get(theme)
+        if s is None:
+            return
+        score = metric_score(metric, s["total"], s["correct"], s["best_streak"], self.min_questions)
+        if score is None:
+            index.remove(user_id)
+        else:
+            index.update(user_id, score)
+
+    # --------------------------------------------------
+    # BACKGROUND REBUILD (stale boards)
+    # --------------------------------------------------
+    def _rebuild_in_background(self, metric, theme):
+        key = (metric, theme)
+        with self._lock:
+            if key in self._rebuilding:
+                return
+            self._rebuilding[key] = []
+        threading.Thread(target=self._rebuild, args=key, name="leaderboard-rebuild", daemon=True).start()
+
+    def _rebuild(self, metric, theme):
+        key = (metric, theme)
+        index = None
+        try:
+            with self.app_context() if self.app_context else nullcontext():
+                index = self._build(metric, theme)
+        finally:
+            with self._lock:
+                replay = self._rebuilding.pop(key, [])
+                if index is not None:
+                    for user_id, totals in replay:
+                        self._apply(index, key, user_id, totals)
+                    self._boards[key] = (index, time.monotonic())
+
+    # --------------------------------------------------
+    # BUILD (one GROUP BY query)
+    # --------------------------------------------------
+    def _build(self, metric, theme):
+        S = self.StatsModel
+        query = self.db.session.query(
+            S.user_id,
+            func.sum(S.total_questions),
+            func.sum(S.correct_answers),
+            func.max(S.best_streak)
+        )
+        if theme is not None:
+            query = query.filter(S.theme == theme)
+        rows = query.group_by(S.user_id).all()
+
+        scores = {}
+        for uid, total, correct, best in rows:
+            score = metric_score(metric, total or 0, correct or 0, best or 0, self.min_questions)
+            if score is not None:
+                scores[uid] = score
+        return RankIndex(scores)
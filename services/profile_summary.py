@@ -0,0 +1,82 @@
+# services/profile_summary.py
+"""
+Materialized profile summary (one row per user).
+
+/api/profile used to rebuild totals, percents and best streak from every
+UserThemeStats row plus every achievement on each view. The summary is now
+rebuilt once, at session end (the only time those tables change), and stored
+as ready-to-serve JSON with a version counter. Views read one row by primary
+key and answer 304 when the client's ETag / Last-Modified still match.
+"""
+
+import json
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+
+def build_profile_summary(username, stats_rows, achievement_rows) -> dict:
+    themes = []
+    total_questions = 0
+    best_streak_global = 0
+
+    for entry in stats_rows:
+        total = entry.total_questions
+        correct = entry.correct_answers
+        percent = round((correct / total) * 100, 1) if total > 0 else 0
+
+        themes.append({
+            "theme": entry.theme,
+            "total": total,
+            "correct": correct,
+            "percent": percent,
+            "best_streak": entry.best_streak
+        })
+
+        total_questions += total
+        best_streak_global = max(best_streak_global, entry.best_streak)
+
+    return {
+        "username": username,
+        "total_questions": total_questions,
+        "best_streak": best_streak_global,
+        "themes": themes,
+        "achievements": [
+            {
+                "label": a.label,
+                "count": a.count,
+                "unlocked_at": a.unlocked_at.isoformat()
+            } for a in achievement_rows
+        ]
+    }
+
+
+def refresh_profile_summary(db, user_id: int, username: str, SummaryModel, StatsModel, AchievementModel):
+    """
+    Rebuild and upsert the summary (after the session's own upserts, same
+    transaction). Returns the summary dict. Caller commits.
+    """
+    summary = build_profile_summary(
+        username,
+        StatsModel.query.filter_by(user_id=user_id).all(),
+        AchievementModel.query.filter_by(user_id=user_id).all()
+    )
+
+    table = SummaryModel.__table__
+    stmt = sqlite_insert(table).values(
+        user_id=user_id,
+        data=json.dumps(summary, separators=(",", ":")),
+        version=1,
+        # second precision: HTTP dates (Last-Modified) have no sub-second part
+        updated_at=datetime.utcnow().replace(microsecond=0)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "data": stmt.excluded.data,
+            "version": table.c.version + 1,
+            "updated_at": stmt.excluded.updated_at
+        }
+    )
+    db.session.execute(stmt)
+    return summary
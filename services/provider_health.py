@@ -0,0 +1,163 @@
+# services/provider_health.py
+"""
+Provider health: rolling latency/error stats, circuit breaker and weighted routing.
+
+Each ProviderClient records its outcomes in a ProviderHealth. The router uses the
+health scores to order sources for /api/question, so when one API degrades the
+traffic shifts to the healthy one (or to the local pool/bank when both are down)
+instead of every request timing out on the broken provider first.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderHealth:
+    def __init__(self, name, window=50, min_samples=5, failure_threshold=0.5,
+                 consecutive_failures=5, open_seconds=30.0, target_latency=1.0):
+        self.name = name
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.consecutive_failures = consecutive_failures
+        self.open_seconds = open_seconds
+        self.target_latency = target_latency
+
+        self._outcomes = deque(maxlen=window)  # (ok: bool, latency: float)
+        self._streak = 0                        # consecutive failures
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------
+    # CIRCUIT BREAKER
+    # --------------------------------------------------
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow(self) -> bool:
+        """May we call this provider now? In half-open, a single probe goes through."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def record(self, ok: bool, latency: float):
+        with self._lock:
+            self._outcomes.append((ok, latency))
+            self._streak = 0 if ok else self._streak + 1
+            state = self._current_state()
+
+            if state == HALF_OPEN:
+                # the probe decides
+                if ok:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._trip()
+                self._probing = False
+                return
+
+            if not ok and state == CLOSED and (
+                self._streak >= self.consecutive_failures
+                or (len(self._outcomes) >= self.min_samples
+                    and self._error_rate() >= self.failure_threshold)
+            ):
+                self._trip()
+
+    def record_throttled(self):
+        """
+        The host rate-limited us: says nothing about its health, so no sample
+        and no failure (the client's cooldown handles the pacing). A half-open
+        probe that got throttled frees the slot for the next probe.
+        """
+        with self._lock:
+            if self._current_state() == HALF_OPEN:
+                self._probing = False
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+
+    # --------------------------------------------------
+    # ROLLING STATS
+    # --------------------------------------------------
+    def _error_rate(self):
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for ok, _ in self._outcomes if not ok) / len(self._outcomes)
+
+    def score(self) -> float:
+        """0..1: success rate x latency penalty (0 when the circuit is open)."""
+        with self._lock:
+            if self._current_state() == OPEN:
+                return 0.0
+            if not self._outcomes:
+                return 1.0
+            latencies = sorted(lat for ok, lat in self._outcomes if ok)
+            p50 = latencies[len(latencies) // 2] if latencies else self.target_latency
+            return (1.0 - self._error_rate()) / (1.0 + p50 / self.target_latency)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(lat for _, lat in self._outcomes)
+            return {
+                "state": self._current_state(),
+                "samples": len(self._outcomes),
+                "error_rate": round(self._error_rate(), 3),
+                "p50_ms": round(1000 * latencies[len(latencies) // 2], 1) if latencies else None,
+            }
+
+
+class ProviderRouter:
+    def __init__(self, healths, base_weights):
+        """healths: {source: ProviderHealth}, base_weights: {source: float} (ex: 70/30 split)"""
+        self.healths = healths
+        self.base_weights = base_weights
+
+    def available(self, sources):
+        return [s for s in sources if self.healths[s].state != OPEN]
+
+    def weight(self, source):
+        return self.base_weights.get(source, 1.0) * self.healths[source].score()
+
+    def order(self, sources):
+        """
+        Weighted random order (healthier first on average); sources with an
+        open circuit go last so the pool can still serve what they left behind.
+        """
+        remaining = list(sources)
+        ordered = []
+        while remaining:
+            weights = [self.weight(s) for s in remaining]
+            if sum(weights) <= 0:
+                ordered.extend(remaining)
+                break
+            pick = random.choices(remaining, weights=weights)[0]
+            ordered.append(pick)
+            remaining.remove(pick)
+        return ordered
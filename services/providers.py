@@ -0,0 +1,220 @@
+# services/providers.py
+"""
+Shared HTTP client layer for the question providers (OpenTriviaDB, TheTriviaAPI).
+
+- one pooled keep-alive requests.Session per provider (bounded connections per host)
+- retries with exponential backoff + full jitter, only on transient errors
+- provider-level throttling: when a host says "rate limited" we stop retrying
+  and put the whole provider in cooldown instead of burning attempts
+- optional client-side pacing (`min_interval`, ex: OpenTDB's 1 request / 5s / IP),
+  shared by every thread using the client: a call that finds the slot taken is
+  refused locally (or waits, with wait=True) instead of earning a code 5
+- every attempt is reported to an optional ProviderHealth (circuit breaker,
+  see services/provider_health.py)
+"""
+
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.provider_health import OPEN
+
+
+class ProviderError(Exception):
+    """Non-retryable provider failure (bad parameters, unexpected payload...)."""
+
+
+class ProviderEmpty(ProviderError):
+    """The provider answered correctly but has no (or not enough) questions."""
+
+
+class ProviderRateLimited(ProviderError):
+    """The provider throttled us; `retry_after` is in seconds."""
+
+    def __init__(self, message, retry_after=5.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ProviderUnavailable(ProviderError):
+    """Circuit breaker open for this provider: don't even try."""
+
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ProviderRetryable(Exception):
+    """Transient failure: worth another attempt after backoff."""
+
+
+# --------------------------------------------------
+# PAYLOAD CHECKS (provider specific)
+# --------------------------------------------------
+OPENTDB_RATE_LIMIT_SECONDS = 5.0  # OpenTriviaDB: 1 request / 5s / IP
+
+
+def check_opentdb_response(data):
+    """
+    OpenTriviaDB response_code:
+    0 success, 1 no results, 2 invalid parameter,
+    3 token not found, 4 token empty, 5 rate limit
+    """
+    if not isinstance(data, dict):
+        raise ProviderError("OpenTriviaDB: unexpected payload")
+
+    code = data.get("response_code", 0)
+    if code == 5:
+        raise ProviderRateLimited("OpenTriviaDB rate limit", retry_after=OPENTDB_RATE_LIMIT_SECONDS)
+    if code in (1, 4):
+        raise ProviderEmpty(f"OpenTriviaDB returned no results (code {code})")
+    if code != 0:
+        raise ProviderError(f"OpenTriviaDB error (code {code})")
+    if not data.get("results"):
+        raise ProviderEmpty("OpenTriviaDB returned no results")
+
+
+def check_triviaapi_response(data):
+    if not isinstance(data, list):
+        raise ProviderError("TheTriviaAPI: unexpected payload")
+    if not data:
+        raise ProviderEmpty("TheTriviaAPI returned no results")
+
+
+# --------------------------------------------------
+# CLIENT
+# --------------------------------------------------
+class ProviderClient:
+    def __init__(self, name, base_url, check=None, health=None, timeout=5.0, pool_connections=2,
+                 pool_maxsize=10, max_retries=2, backoff_base=0.25, backoff_max=4.0, min_interval=0.0):
+        self.name = name
+        self.health = health
+        self.base_url = base_url.rstrip("/")
+        self.check = check
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.min_interval = min_interval
+
+        # pool_block=True: never more than pool_maxsize sockets to this host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._cooldown_until = 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def cooling_down(self) -> bool:
+        return time.monotonic() < self._cooldown_until
+
+    def _throttle(self, seconds: float):
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + seconds)
+
+    def _reserve_slot(self, wait=False):
+        """Pacing: take the next request slot of this host, or raise ProviderRateLimited."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._cooldown_until, self._next_slot if self.min_interval else now)
+            if start > now and not wait:
+                raise ProviderRateLimited(f"{self.name} paced", retry_after=start - now)
+            self._next_slot = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+    def get_json(self, path, params=None, max_retries=None, wait=False):
+        """wait=True: sleep until the next request slot instead of raising ProviderRateLimited."""
+        if self.cooling_down() and not wait:
+            raise ProviderRateLimited(f"{self.name} cooling down",
+                                      retry_after=self._cooldown_until - time.monotonic())
+
+        if self.health and not self.health.allow():
+            raise ProviderUnavailable(f"{self.name} circuit open",
+                                      retry_after=self.health.retry_after() or 1.0)
+
+        retries = self.max_retries if max_retries is None else max_retries
+        url = self.base_url + path
+        last_error = None
+
+        for attempt in range(retries + 1):
+            if attempt:
+                if self.health and self.health.state == OPEN:
+                    raise ProviderUnavailable(f"{self.name} circuit opened",
+                                              retry_after=self.health.retry_after() or 1.0)
+                time.sleep(self.backoff(attempt - 1))
+            try:
+                self._reserve_slot(wait=wait or attempt > 0)
+            except ProviderRateLimited:
+                # local refusal: nothing was sent, but a half-open probe slot
+                # taken by allow() above must be handed back
+                if self.health:
+                    self.health.record_throttled()
+                raise
+            try:
+                return self._timed_get(url, params)
+            except ProviderRateLimited as e:
+                self._throttle(e.retry_after)
+                raise
+            except ProviderRetryable as e:
+                last_error = e
+
+        raise ProviderError(f"{self.name}: giving up after {retries + 1} attempts ({last_error})")
+
+    def _timed_get(self, url, params):
+        started = time.monotonic()
+        ok = False
+        try:
+            data = self._get_once(url, params)
+            ok = True
+            return data
+        except ProviderEmpty:
+            ok = True  # healthy host, just nothing to give
+            raise
+        except ProviderRateLimited:
+            ok = None  # healthy host called too often: cooldown, not a failure
+            raise
+        finally:
+            if self.health:
+                if ok is None:
+                    self.health.record_throttled()
+                else:
+                    self.health.record(ok, time.monotonic() - started)
+
+    def _get_once(self, url, params):
+        try:
+            r = self.session.get(url, params=params, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise ProviderRetryable(str(e))
+
+        if r.status_code == 429:
+            raise ProviderRateLimited(f"{self.name} HTTP 429", retry_after=_retry_after(r))
+        if r.status_code >= 500:
+            raise ProviderRetryable(f"HTTP {r.status_code}")
+        if r.status_code >= 400:
+            raise ProviderError(f"{self.name} HTTP {r.status_code}")
+
+        try:
+            data = r.json()
+        except ValueError:
+            raise ProviderRetryable("invalid JSON")
+
+        if self.check:
+            self.check(data)
+        return data
+
+
+def _retry_after(response, default=5.0):
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except (TypeError, ValueError):
+        return default
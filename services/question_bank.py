@@ -0,0 +1,186 @@
+# services/question_bank.py
+"""
+Persistent question bank.
+
+Every question fetched from a provider is written here (hash = primary key), so
+already-known questions can be served again to users who haven't seen them,
+without re-hitting the external APIs.
+"""
+
+import random
+from datetime import datetime
+
+from sqlalchemy import func, literal_column, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+
+def store_questions(db, QuestionModel, questions):
+    """Bulk INSERT OR IGNORE of pooled-question dicts. Returns the number of rows sent."""
+    rows = [
+        {
+            "hash": q["hash"],
+            "theme": q["theme"],
+            "difficulty": q["difficulty"],
+            "source": q["source"],
+            "text": q["question"],
+            "correct": q["correct"],
+            "answers": q["answers"],
+            "created_at": datetime.utcnow()
+        }
+        for q in questions if q.get("theme")
+    ]
+    if not rows:
+        return 0
+
+    stmt = sqlite_insert(QuestionModel.__table__).on_conflict_do_nothing(index_elements=["hash"])
+    db.session.execute(stmt, rows)
+    db.session.commit()
+    return len(rows)
+
+
+def to_pooled(row):
+    answers = list(row.answers)
+    random.shuffle(answers)
+    return {
+        "hash": row.hash,
+        "question": row.text,
+        "correct": row.correct,
+        "answers": answers,
+        "difficulty": row.difficulty,
+        "theme": row.theme,
+        "source": row.source
+    }
+
+
+DIFFICULTIES = ("easy", "medium", "hard")
+
+
+def _unseen_window(db, QuestionModel, SeenModel, user_id, theme, difficulty, pivot, limit, exclude=()):
+    """
+    Up to `limit` questions of one (theme, difficulty) that `user_id` has never
+    seen, read along ix_question_theme_difficulty (theme, difficulty, rowid)
+    from rowid `pivot`, wrapping around. SQLite walks the index in order and
+    stops at LIMIT: the NOT EXISTS probe only runs on the rows walked, never on
+    the whole bucket, and nothing is sorted.
+    """
+    rowid = literal_column(f"{QuestionModel.__tablename__}.rowid")
+    seen = (
+        db.session.query(SeenModel.id)
+        .filter(
+            SeenModel.user_id == user_id,
+            SeenModel.question_hash == QuestionModel.hash
+        )
+    )
+    query = QuestionModel.query.filter(
+        QuestionModel.theme == theme,
+        QuestionModel.difficulty == difficulty,
+        ~seen.exists()
+    )
+    if exclude:
+        query = query.filter(QuestionModel.hash.notin_(list(exclude)))
+
+    rows = query.filter(rowid >= pivot).order_by(rowid).limit(limit).all()
+    if len(rows) < limit:
+        rows += query.filter(rowid < pivot).order_by(rowid).limit(limit - len(rows)).all()
+    return rows
+
+
+def _random_pivot(db, QuestionModel):
+    """Random rowid of the bank (a lone MAX(rowid) is one b-tree lookup, MIN+MAX is a scan)."""
+    rowid = literal_column(f"{QuestionModel.__tablename__}.rowid")
+    high = db.session.query(func.max(rowid)).select_from(QuestionModel).scalar()
+    return random.randint(1, high) if high else 0
+
+
+def _buckets(themes, difficulty=None):
+    """(theme, difficulty) index ranges to visit, in random order."""
+    keys = [(t, d) for t in themes for d in ((difficulty,) if difficulty else DIFFICULTIES)]
+    random.shuffle(keys)
+    return keys
+
+
+def pick_unseen(db, QuestionModel, SeenModel, user_id: int, themes, difficulty=None,
+                skip=None, candidates=5):
+    """
+    A random bank question in `themes` (and `difficulty`) that `user_id` has
+    never seen: (theme, difficulty) buckets in random order, each read as a
+    small anti-joined window from a random rowid (see _unseen_window).
+    `skip(hash) -> bool` filters the few candidates in Python (ex: hashes
+    already used this session).
+    """
+    pivot = _random_pivot(db, QuestionModel)
+    for theme, diff in _buckets(themes, difficulty):
+        rows = _unseen_window(db, QuestionModel, SeenModel, user_id, theme, diff, pivot, candidates)
+        for row in rows:
+            if not (skip and skip(row.hash)):
+                return to_pooled(row)
+    return None
+
+
+def pick_unseen_many(db, QuestionModel, SeenModel, user_id: int, themes, limit: int, difficulty=None):
+    """
+    Up to `limit` unseen questions at once (session planning), spread over the
+    (theme, difficulty) buckets: one window per bucket, then the buckets that
+    still had rows fill what is missing.
+    """
+    pivot = _random_pivot(db, QuestionModel)
+    keys = _buckets(themes, difficulty)
+    if not keys or limit <= 0:
+        return []
+
+    picked = []
+    share = -(-limit // len(keys))  # ceil
+    for _ in range(2):
+        full = []
+        for theme, diff in keys:
+            want = min(share, limit - len(picked))
+            if want <= 0:
+                break
+            rows = _unseen_window(db, QuestionModel, SeenModel, user_id, theme, diff, pivot, want,
+                                  exclude=[r.hash for r in picked])
+            picked += rows
+            if len(rows) == want:
+                full.append((theme, diff))
+        if len(picked) >= limit or not full:
+            break
+        keys, share = full, limit - len(picked)
+    return [to_pooled(row) for row in picked]
+
+
+def sample_bucket(db, QuestionModel, theme, difficulty, source, limit: int):
+    """`limit` random bank questions of one pool bucket (offline pool refill)."""
+    rows = (
+        QuestionModel.query
+        .filter_by(theme=theme, difficulty=difficulty, source=source)
+        .order_by(db.func.random())
+        .limit(limit)
+        .all()
+    )
+    return [to_pooled(row) for row in rows]
+
+
+# --------------------------------------------------
+# FULL-TEXT INDEX (SQLite FTS5)
+# --------------------------------------------------
+def ensure_fulltext_index(db, table="question"):
+    """
+    External-content FTS5 index over question text, kept in sync by triggers.
+    Silently skipped when the SQLite build has no FTS5.
+    """
+    fts = f"{table}_fts"
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"text, content='{table}', content_rowid='rowid')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, text) VALUES (new.rowid, new.text); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.rowid, old.text); END",
+    ]
+    try:
+        for sql in statements:
+            db.session.execute(text(sql))
+        db.session.commit()
+        return True
+    except Exception:
+        db.session.rollback()
+        return False
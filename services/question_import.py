@@ -0,0 +1,158 @@
+# services/question_import.py
+"""
+Bulk import of provider question dumps into the question bank.
+
+Input is JSONL, in either provider's native shape (one object per line, or a
+whole API response per line):
+- OpenTriviaDB : {"category", "type", "difficulty", "question", "correct_answer",
+                  "incorrect_answers"}, or {"response_code", "results": [...]}
+                  Texts are decoded like /api.php returns them: HTML entities by
+                  default, or encode=base64 / url3986 dumps.
+- TheTriviaAPI : {"category", "tags", "difficulty", "question": {"text"} (v2) or
+                  "question": "..." (v1), "correctAnswer", "incorrectAnswers"},
+                  or a /v2/questions array
+
+Categories and tags are mapped to Trickia themes with theme_for_category().
+Rows without a theme, not multiple choice, without an easy/medium/hard
+difficulty (pool buckets and pick_unseen would never serve them), or with
+missing fields are counted and skipped. Rows go to the bank in batches through
+`store` (INSERT OR IGNORE on the question hash): importing the same dump twice
+adds nothing.
+"""
+
+import base64
+import html
+import json
+from collections import Counter
+from urllib.parse import unquote
+
+from services.themes import theme_for_category
+
+DIFFICULTIES = ("easy", "medium", "hard")
+
+DECODERS = {
+    "html": html.unescape,
+    "base64": lambda s: base64.b64decode(s).decode("utf-8"),
+    "url3986": unquote,
+}
+
+
+class SkipRow(Exception):
+    """A dump row that can't become a bank question (the message is the reason)."""
+
+
+def _difficulty(value):
+    value = (value or "").strip().lower()
+    if value not in DIFFICULTIES:
+        raise SkipRow("unknown_difficulty")
+    return value
+
+
+def parse_opentdb(item, decode=html.unescape):
+    """(question, correct, incorrect, difficulty, theme, source) for an OpenTDB result."""
+    try:
+        if decode(item.get("type") or "multiple") != "multiple":
+            raise SkipRow("not_multiple_choice")
+        category = decode(item.get("category") or "")
+        question = decode(item["question"]).strip()
+        correct = decode(item["correct_answer"]).strip()
+        incorrect = [decode(a).strip() for a in item["incorrect_answers"]]
+        difficulty = decode(item.get("difficulty") or "")
+    except (KeyError, TypeError, ValueError) as e:
+        raise SkipRow("malformed") from e
+
+    theme = theme_for_category(category)
+    if not theme:
+        raise SkipRow("unmapped_category")
+    if not question or not correct or not incorrect:
+        raise SkipRow("malformed")
+    return question, correct, incorrect, _difficulty(difficulty), theme, "OpenTriviaDB"
+
+
+def parse_triviaapi(item):
+    """(question, correct, incorrect, difficulty, theme, source) for a TheTriviaAPI question."""
+    if (item.get("type") or "text_choice") != "text_choice":
+        raise SkipRow("not_multiple_choice")
+    try:
+        question = item["question"]
+        question = (question.get("text") if isinstance(question, dict) else question or "").strip()
+        correct = item["correctAnswer"].strip()
+        incorrect = [a.strip() for a in item["incorrectAnswers"]]
+    except (KeyError, TypeError, AttributeError) as e:
+        raise SkipRow("malformed") from e
+
+    # category first (ex: "film_and_tv"), then the tags (ex: ["film", "oscars"])
+    theme = next(
+        (t for t in map(theme_for_category, [item.get("category")] + list(item.get("tags") or ())) if t),
+        None
+    )
+    if not theme:
+        raise SkipRow("unmapped_category")
+    if not question or not correct or not incorrect:
+        raise SkipRow("malformed")
+    return question, correct, incorrect, _difficulty(item.get("difficulty")), theme, "TheTriviaAPI"
+
+
+def iter_dump_items(lines):
+    """Provider items of a JSONL dump (API responses are unwrapped). Bad lines: None."""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            yield None
+            continue
+        if isinstance(data, dict) and isinstance(data.get("results"), list):
+            data = data["results"]  # one /api.php response per line
+        if isinstance(data, list):
+            yield from data
+        else:
+            yield data
+
+
+def parse_item(item, decode=html.unescape):
+    if not isinstance(item, dict):
+        raise SkipRow("malformed")
+    if "correct_answer" in item:
+        return parse_opentdb(item, decode)
+    if "correctAnswer" in item:
+        return parse_triviaapi(item)
+    raise SkipRow("unknown_shape")
+
+
+def import_question_dump(lines, store, make_question, encoding="html", batch_size=1000):
+    """
+    Parse a dump (iterable of JSONL lines) and bank it in batches.
+    store(questions) -> rows sent; make_question(question, correct, incorrect,
+    difficulty, theme, source) -> pooled-question dict.
+    Returns {"read", "stored", "skipped": Counter, "themes": Counter}.
+    """
+    decode = DECODERS[encoding]
+    report = {"read": 0, "stored": 0, "skipped": Counter(), "themes": Counter()}
+    batch, hashes = [], set()
+
+    for item in iter_dump_items(lines):
+        report["read"] += 1
+        try:
+            fields = parse_item(item, decode)
+        except SkipRow as e:
+            report["skipped"][str(e)] += 1
+            continue
+
+        q = make_question(*fields)
+        if q["hash"] in hashes:
+            report["skipped"]["duplicate"] += 1
+            continue
+        hashes.add(q["hash"])
+        batch.append(q)
+        report["themes"][q["theme"]] += 1
+
+        if len(batch) >= batch_size:
+            report["stored"] += store(batch)
+            batch = []
+
+    if batch:
+        report["stored"] += store(batch)
+    return report
@@ -0,0 +1,165 @@
+# services/question_pool.py
+"""
+Server-side question pool.
+
+Questions are kept in memory in buckets keyed by (Trickia theme, difficulty, source).
+/api/question only pops from these buckets; a background worker refills every bucket
+that falls under its low-water mark with one bulk upstream call (amount=50).
+
+A pooled question is a plain dict:
+    {"hash", "question", "correct", "answers", "difficulty", "theme", "source"}
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class QuestionPool:
+    def __init__(self, refill_fn, batch_size=50, low_water=10, max_per_bucket=200,
+                 retry_delay=30.0, max_scan=20):
+        """
+        refill_fn: (theme, difficulty, source, amount) -> list[dict]
+        Every returned question is filed under its *own* (theme, difficulty, source),
+        so a batch that comes back with mixed difficulties is never wasted.
+        """
+        self.refill_fn = refill_fn
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.max_per_bucket = max_per_bucket
+        self.retry_delay = retry_delay
+        self.max_scan = max_scan
+
+        self._buckets = {}        # key -> deque[dict]
+        self._hashes = set()      # hashes currently pooled (anti-doublons)
+        self._pending = set()     # keys waiting for a refill
+        self._retry_at = {}       # key -> timestamp before which we don't retry a failed refill
+        self._cond = threading.Condition()
+        self._thread = None
+
+    # --------------------------------------------------
+    # READ PATH (request thread)
+    # --------------------------------------------------
+    def pop(self, theme, difficulty, sources, skip=None):
+        """
+        Pop one question for `theme`/`difficulty`, trying `sources` in order.
+        `skip(question) -> bool` rejects questions (e.g. already seen by the user);
+        rejected questions are put back so other users can still get them.
+        Returns None on a miss. Never blocks on the network.
+        """
+        self.start()
+        for source in sources:
+            key = (theme, difficulty, source)
+            rejected = []
+            found = None
+
+            while len(rejected) < self.max_scan:
+                with self._cond:
+                    bucket = self._buckets.get(key)
+                    q = bucket.popleft() if bucket else None
+                    if q:
+                        self._hashes.discard(q["hash"])
+                    self._watch(key)
+                if q is None:
+                    break
+                # skip() may hit the DB: never call it with the lock held
+                if skip and skip(q):
+                    rejected.append(q)
+                    continue
+                found = q
+                break
+
+            self.push_many(rejected)
+            if found:
+                return found
+        return None
+
+    def request(self, keys):
+        """Ask the worker to warm up some buckets (ex: at session start)."""
+        self.start()
+        with self._cond:
+            for key in keys:
+                self._watch(key)
+
+    def size(self, key=None):
+        with self._cond:
+            if key is not None:
+                return len(self._buckets.get(key, ()))
+            return sum(len(b) for b in self._buckets.values())
+
+    def stock(self, keys):
+        """Sizes of several buckets under one lock acquisition."""
+        with self._cond:
+            return [len(self._buckets.get(key, ())) for key in keys]
+
+    # --------------------------------------------------
+    # WRITE PATH
+    # --------------------------------------------------
+    def push_many(self, questions):
+        """File questions into their own buckets. Returns how many were added."""
+        added = 0
+        with self._cond:
+            for q in questions:
+                if q["hash"] in self._hashes:
+                    continue
+                key = (q["theme"], q["difficulty"], q["source"])
+                bucket = self._buckets.setdefault(key, deque())
+                if len(bucket) >= self.max_per_bucket:
+                    continue
+                bucket.append(q)
+                self._hashes.add(q["hash"])
+                added += 1
+        return added
+
+    # --------------------------------------------------
+    # BACKGROUND WORKER
+    # --------------------------------------------------
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="question-pool-refill", daemon=True)
+            self._thread.start()
+
+    def _watch(self, key):
+        # must be called with self._cond held
+        if len(self._buckets.get(key, ())) < self.low_water and key not in self._pending:
+            self._pending.add(key)
+            self._cond.notify()
+
+    def _next_key(self):
+        # must be called with self._cond held
+        now = time.monotonic()
+        for key in self._pending:
+            if self._retry_at.get(key, 0) <= now:
+                return key
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                key = self._next_key()
+                while key is None:
+                    self._cond.wait(timeout=self.retry_delay)
+                    key = self._next_key()
+
+            theme, difficulty, source = key
+            delay = self.retry_delay
+            try:
+                fetched = self.refill_fn(theme, difficulty, source, self.batch_size)
+            except Exception as e:
+                fetched = []
+                # throttled provider (ProviderRateLimited): retry as soon as it allows
+                delay = getattr(e, "retry_after", delay)
+
+            self.push_many(fetched)
+
+            with self._cond:
+                if len(self._buckets.get(key, ())) >= self.low_water:
+                    self._pending.discard(key)
+                    self._retry_at.pop(key, None)
+                else:
+                    # provider empty/down for this bucket: don't hammer it
+                    self._retry_at[key] = time.monotonic() + delay
@@ -0,0 +1,168 @@
+# services/seen_filter.py
+"""
+Per-user Bloom filter over seen question hashes.
+
+question() consults the filter before the exact UserSeenQuestion lookup:
+- "not in filter" => definitely never seen, no DB round trip
+- "maybe in filter" => exact DB check (false positives ~1%)
+
+Filters are loaded lazily, kept in a per-process LRU, updated on insert and
+persisted (UserSeenFilter row) so a new process doesn't rescan every hash.
+They are always rebuildable from UserSeenQuestion: the persisted row keeps
+`last_row_id`, and any newer UserSeenQuestion rows are replayed on load.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+
+class BloomFilter:
+    def __init__(self, capacity=1000, error_rate=0.01, bits=None, count=0):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = error_rate
+        self.m = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.k = max(1, int(round(self.m / self.capacity * math.log(2))))
+        self.bits = bytearray(bits) if bits is not None else bytearray((self.m + 7) // 8)
+        self.count = count
+
+    def _indexes(self, hex_hash: str):
+        # the SHA-256 is already uniform: double hashing from two 64-bit slices
+        h1 = int(hex_hash[:16], 16)
+        h2 = int(hex_hash[16:32], 16) | 1
+        return ((h1 + i * h2) % self.m for i in range(self.k))
+
+    def add(self, hex_hash: str) -> bool:
+        """Returns True if the hash was (probably) new."""
+        new = False
+        for i in self._indexes(hex_hash):
+            byte, bit = divmod(i, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= (1 << bit)
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, hex_hash: str) -> bool:
+        for i in self._indexes(hex_hash):
+            byte, bit = divmod(i, 8)
+            if not self.bits[byte] & (1 << bit):
+                return False
+        return True
+
+    @property
+    def full(self) -> bool:
+        return self.count > self.capacity
+
+
+class SeenFilterCache:
+    def __init__(self, db, SeenModel, FilterModel, max_users=5000, refresh_seconds=30.0,
+                 min_capacity=1000, error_rate=0.01):
+        """
+        refresh_seconds: how often a cached filter replays UserSeenQuestion rows
+        inserted by *other* processes (rows inserted here are added directly).
+        """
+        self.db = db
+        self.SeenModel = SeenModel
+        self.FilterModel = FilterModel
+        self.max_users = max_users
+        self.refresh_seconds = refresh_seconds
+        self.min_capacity = min_capacity
+        self.error_rate = error_rate
+
+        self._filters = OrderedDict()  # user_id -> (BloomFilter, last_row_id, refreshed_at)
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------
+    # PUBLIC
+    # --------------------------------------------------
+    def might_have_seen(self, user_id: int, q_hash: str) -> bool:
+        bloom = self._get(user_id)
+        return q_hash in bloom
+
+    def add(self, user_id: int, q_hash: str):
+        # bit updates are read-modify-write on a shared bytearray: under the lock
+        with self._lock:
+            entry = self._filters.get(user_id)
+            if entry:
+                entry[0].add(q_hash)
+
+    def save(self, user_id: int):
+        """Persist the filter (ex: at session end). Caller commits."""
+        with self._lock:
+            entry = self._filters.get(user_id)
+        if not entry:
+            return
+        # replay first so last_row_id covers the rows we added directly
+        entry = self._catch_up(user_id, *entry[:2])
+        with self._lock:
+            self._filters[user_id] = entry
+        bloom, last_row_id, _ = entry
+        values = {
+            "user_id": user_id,
+            "capacity": bloom.capacity,
+            "error_rate": bloom.error_rate,
+            "count": bloom.count,
+            "last_row_id": last_row_id,
+            "bits": bytes(bloom.bits),
+            "updated_at": datetime.utcnow()
+        }
+        stmt = sqlite_insert(self.FilterModel.__table__).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={k: v for k, v in values.items() if k != "user_id"}
+        )
+        self.db.session.execute(stmt)
+
+    # --------------------------------------------------
+    # LOAD / REFRESH
+    # --------------------------------------------------
+    def _get(self, user_id):
+        with self._lock:
+            entry = self._filters.get(user_id)
+            if entry:
+                self._filters.move_to_end(user_id)
+
+        if entry is None:
+            entry = self._load(user_id)
+        elif time.monotonic() - entry[2] > self.refresh_seconds:
+            entry = self._catch_up(user_id, *entry[:2])
+
+        if entry[0].full:
+            entry = self._rebuild(user_id, capacity=entry[0].count * 2)
+
+        with self._lock:
+            self._filters[user_id] = entry
+            self._filters.move_to_end(user_id)
+            while len(self._filters) > self.max_users:
+                self._filters.popitem(last=False)
+        return entry[0]
+
+    def _load(self, user_id):
+        row = self.FilterModel.query.get(user_id)
+        if row is None:
+            return self._rebuild(user_id)
+        bloom = BloomFilter(row.capacity, row.error_rate, bits=row.bits, count=row.count)
+        return self._catch_up(user_id, bloom, row.last_row_id)
+
+    def _catch_up(self, user_id, bloom, last_row_id):
+        rows = (
+            self.db.session.query(self.SeenModel.id, self.SeenModel.question_hash)
+            .filter(self.SeenModel.user_id == user_id, self.SeenModel.id > last_row_id)
+            .all()
+        )
+        with self._lock:
+            for row_id, q_hash in rows:
+                bloom.add(q_hash)
+                last_row_id = max(last_row_id, row_id)
+        return bloom, last_row_id, time.monotonic()
+
+    def _rebuild(self, user_id, capacity=None):
+        total = self.SeenModel.query.filter_by(user_id=user_id).count()
+        bloom = BloomFilter(max(self.min_capacity, capacity or 0, total * 2), self.error_rate)
+        return self._catch_up(user_id, bloom, 0)
@@ -0,0 +1,141 @@
+# services/session_persistence.py
+"""
+End-of-session persistence in a constant number of statements.
+
+Loads the user's stats, achievements and bandit rows with one query each,
+applies the session in memory, then writes everything back with bulk upserts
+and a single commit (instead of one query + one commit per theme).
+
+Counters (totals, badge counts) are written as increments in the ON CONFLICT
+clause, so two sessions of the same user ending together can't lose an update.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from services.bandit import beta_mean, discounted_update
+
+EXPERT_MIN_QUESTIONS = 2
+EXPERT_MIN_ACCURACY = 0.85
+
+
+def expert_label(theme: str) -> str:
+    return f"Expert in {theme}!"
+
+
+def persist_session_results(db, user_id: int, theme_stats: dict, best_streak: int, themes, discount: float,
+                            StatsModel, AchievementModel, StateModel, SnapModel, cache=None):
+    """
+    theme_stats: {theme: {"total": int, "correct": int}} (session only)
+    themes: every Trickia theme (bandit rows are created with a neutral prior)
+    Returns {"step", "badges", "stats", "bandit"} with the updated values. Caller commits.
+    """
+    now = datetime.utcnow()
+    played = {
+        t: (int(s.get("total", 0)), int(s.get("correct", 0)))
+        for t, s in theme_stats.items()
+        if int(s.get("total", 0)) > 0   # 🚫 Ignore thèmes sans vraies questions
+    }
+
+    # --------------------------------------------------
+    # 1) LOAD (one query per table)
+    # --------------------------------------------------
+    stats = {r.theme: r for r in StatsModel.query.filter_by(user_id=user_id).all()}
+    achievements = {r.label: r for r in AchievementModel.query.filter_by(user_id=user_id).all()}
+    bandit = {r.theme: r for r in StateModel.query.filter_by(user_id=user_id).all()}
+    last_step = (
+        db.session.query(func.max(SnapModel.step))
+        .filter(SnapModel.user_id == user_id)
+        .scalar()
+    )
+    step = (last_step or 0) + 1
+
+    # --------------------------------------------------
+    # 2) APPLY IN MEMORY
+    # --------------------------------------------------
+    stats_rows, stats_result = [], {}
+    badge_rows, badges = [], []
+    for theme, (total, correct) in played.items():
+        old = stats.get(theme)
+        stats_rows.append({
+            "user_id": user_id,
+            "theme": theme,
+            "total_questions": total,
+            "correct_answers": correct,
+            "best_streak": best_streak,
+            "last_played": now
+        })
+        stats_result[theme] = {
+            "total": (old.total_questions if old else 0) + total,
+            "correct": (old.correct_answers if old else 0) + correct,
+            "best_streak": max(old.best_streak if old else 0, best_streak)
+        }
+
+        # 🏆 ACHIEVEMENT: Expert in <theme> (SESSION-BASED ONLY)
+        if total >= EXPERT_MIN_QUESTIONS and correct / total >= EXPERT_MIN_ACCURACY:
+            label = expert_label(theme)
+            prev = achievements.get(label)
+            badge_rows.append({"user_id": user_id, "label": label, "count": 1, "unlocked_at": now})
+            badges.append({"label": label, "count": (prev.count if prev else 0) + 1, "new": prev is None})
+
+    bandit_rows, snap_rows, bandit_result = [], [], {}
+    for theme in list(themes) + [t for t in played if t not in themes]:
+        row = bandit.get(theme)
+        alpha, beta = (row.alpha, row.beta) if row else (1.0, 1.0)  # prior neutre
+
+        if theme in played:
+            total, correct = played[theme]
+            alpha, beta = discounted_update(alpha, beta, correct, total, discount)
+        elif row:
+            continue  # rien de neuf pour ce thème
+
+        bandit_rows.append({"user_id": user_id, "theme": theme, "alpha": alpha, "beta": beta, "updated_at": now})
+        if theme in played:
+            mean = beta_mean(alpha, beta)
+            snap_rows.append({
+                "user_id": user_id, "theme": theme, "step": step,
+                "mean": mean, "alpha": alpha, "beta": beta, "created_at": now
+            })
+            bandit_result[theme] = mean
+
+    # --------------------------------------------------
+    # 3) WRITE BACK (bulk upserts)
+    # --------------------------------------------------
+    if stats_rows:
+        stmt = sqlite_insert(StatsModel.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "theme"],
+            set_={
+                "total_questions": StatsModel.__table__.c.total_questions + stmt.excluded.total_questions,
+                "correct_answers": StatsModel.__table__.c.correct_answers + stmt.excluded.correct_answers,
+                "best_streak": func.max(StatsModel.__table__.c.best_streak, stmt.excluded.best_streak),
+                "last_played": stmt.excluded.last_played
+            }
+        )
+        db.session.execute(stmt, stats_rows)
+
+    if badge_rows:
+        stmt = sqlite_insert(AchievementModel.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "label"],
+            set_={"count": AchievementModel.__table__.c.count + 1}
+        )
+        db.session.execute(stmt, badge_rows)
+
+    if bandit_rows:
+        stmt = sqlite_insert(StateModel.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "theme"],
+            set_={"alpha": stmt.excluded.alpha, "beta": stmt.excluded.beta, "updated_at": stmt.excluded.updated_at}
+        )
+        db.session.execute(stmt, bandit_rows)
+
+    if snap_rows:
+        db.session.execute(sqlite_insert(SnapModel.__table__), snap_rows)
+
+    if cache is not None:
+        cache.invalidate(user_id)
+
+    return {"step": step, "badges": badges, "stats": stats_result, "bandit": bandit_result}
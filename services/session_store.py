@@ -0,0 +1,232 @@
+# services/session_store.py
+"""
+Server-side storage for quiz_state.
+
+The Flask cookie only carries a random session id ("quiz_sid"); the state itself
+lives in a pluggable backend:
+- LRUStore     : in-process, bounded (tests, single worker, or front cache)
+- SQLiteStore  : one row per quiz session (shared by every worker process); rows
+                 not saved for `ttl` seconds are ignored and purged (abandoned sessions)
+- RedisStore   : any client exposing get / set(ex=) / delete (redis-py, or DictRedis locally)
+- TieredStore  : LRU in front of a shared backend (write-through)
+
+State is stored compactly: used_hashes is a set of 8-byte truncated hashes,
+serialized as one base64 blob instead of a list of 64-char hex strings.
+"""
+
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+SHORT_HASH_BYTES = 8
+
+
+def short_hash(q_hash: str) -> bytes:
+    """64-bit prefix of the SHA-256: plenty to dedupe one quiz session."""
+    return bytes.fromhex(q_hash[:2 * SHORT_HASH_BYTES])
+
+
+# --------------------------------------------------
+# (DE)SERIALIZATION
+# --------------------------------------------------
+def encode_state(state: dict) -> bytes:
+    data = dict(state)
+    data["used_hashes"] = base64.b64encode(b"".join(sorted(state.get("used_hashes", ())))).decode("ascii")
+    if isinstance(data.get("start_time"), datetime):
+        data["start_time"] = data["start_time"].isoformat()
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def decode_state(raw) -> dict:
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8")
+    data = json.loads(raw)
+    blob = base64.b64decode(data.get("used_hashes") or "")
+    data["used_hashes"] = {
+        blob[i:i + SHORT_HASH_BYTES] for i in range(0, len(blob), SHORT_HASH_BYTES)
+    }
+    if data.get("start_time"):
+        data["start_time"] = datetime.fromisoformat(data["start_time"])
+    return data
+
+
+# --------------------------------------------------
+# BACKENDS (get / set / delete on encoded bytes)
+# --------------------------------------------------
+class LRUStore:
+    def __init__(self, max_items=10000):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            raw = self._items.get(sid)
+            if raw is not None:
+                self._items.move_to_end(sid)
+            return raw
+
+    def set(self, sid, raw, user_id=None):
+        with self._lock:
+            self._items[sid] = raw
+            self._items.move_to_end(sid)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._items.pop(sid, None)
+
+
+class SQLiteStore:
+    def __init__(self, db, Model, ttl=24 * 3600, purge_every=600.0):
+        self.db = db
+        self.Model = Model
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._next_purge = 0.0
+
+    def _cutoff(self, now=None):
+        return (now or datetime.utcnow()) - timedelta(seconds=self.ttl)
+
+    def get(self, sid):
+        row = self.db.session.get(self.Model, sid)
+        if row is None or (row.updated_at and row.updated_at < self._cutoff()):
+            return None
+        return row.data
+
+    def set(self, sid, raw, user_id=None):
+        values = {"id": sid, "user_id": user_id, "data": raw, "updated_at": datetime.utcnow()}
+        stmt = sqlite_insert(self.Model.__table__).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"data": raw, "updated_at": values["updated_at"]}
+        )
+        self.db.session.execute(stmt)
+        # sessions never ended: swept at most every `purge_every` s, in this commit
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + self.purge_every
+            self._delete_expired(values["updated_at"])
+        self.db.session.commit()
+
+    def _delete_expired(self, now=None):
+        return self.Model.query.filter(self.Model.updated_at < self._cutoff(now)).delete()
+
+    def purge(self, now=None):
+        """Delete every state not saved for `ttl` seconds. Returns the number of rows."""
+        count = self._delete_expired(now)
+        self.db.session.commit()
+        return count
+
+    def delete(self, sid):
+        self.Model.query.filter_by(id=sid).delete()
+        self.db.session.commit()
+
+
+class RedisStore:
+    def __init__(self, client, prefix="trickia:quiz:", ttl=24 * 3600):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, sid):
+        return self.client.get(self.prefix + sid)
+
+    def set(self, sid, raw, user_id=None):
+        self.client.set(self.prefix + sid, raw, ex=self.ttl)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+
+class DictRedis:
+    """Minimal local stand-in for a Redis client (get / set(ex=) / delete)."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._data.get(key, (None, None))
+            if expires is not None and expires < time.monotonic():
+                self._data.pop(key, None)
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return 1 if self._data.pop(key, None) is not None else 0
+
+
+class TieredStore:
+    def __init__(self, front, back):
+        self.front = front
+        self.back = back
+
+    def get(self, sid):
+        raw = self.front.get(sid)
+        if raw is None:
+            raw = self.back.get(sid)
+            if raw is not None:
+                self.front.set(sid, raw)
+        return raw
+
+    def set(self, sid, raw, user_id=None):
+        self.back.set(sid, raw, user_id=user_id)
+        self.front.set(sid, raw)
+
+    def delete(self, sid):
+        self.front.delete(sid)
+        self.back.delete(sid)
+
+
+# --------------------------------------------------
+# FACADE
+# --------------------------------------------------
+class QuizStateStore:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def load(self, sid):
+        if not sid:
+            return None
+        raw = self.backend.get(sid)
+        return decode_state(raw) if raw is not None else None
+
+    def save(self, sid, state, user_id=None):
+        self.backend.set(sid, encode_state(state), user_id=user_id)
+
+    def delete(self, sid):
+        if sid:
+            self.backend.delete(sid)
+
+    # Prefetched next question: separate key, so the background writer never
+    # races with the request that saves the main state
+    def save_next(self, sid, question):
+        self.backend.set(sid + ":next", json.dumps(question).encode("utf-8"))
+
+    def replace_next(self, sid, question):
+        """save_next, returning the unused prefetched question it replaces (or None)."""
+        previous = self.pop_next(sid)
+        self.save_next(sid, question)
+        return previous
+
+    def pop_next(self, sid):
+        if not sid:
+            return None
+        raw = self.backend.get(sid + ":next")
+        if raw is None:
+            return None
+        self.backend.delete(sid + ":next")
+        return json.loads(raw)
@@ -0,0 +1,115 @@
+# services/snapshot_retention.py
+"""
+Bounded bandit history (UserThemeBanditSnapshot).
+
+One snapshot row is written per theme per session, forever. Two tools keep
+that bounded:
+- compact_snapshots(): retention job. The last `keep_recent` steps of each
+  user stay untouched; older ones are merged into fixed buckets of
+  `bucket_size` steps (one averaged row per theme and bucket). Buckets are
+  aligned on step // bucket_size, so running the job again is a no-op.
+- lttb(): Largest-Triangle-Three-Buckets downsampling for /api/model/history,
+  so the chart payload never exceeds `max_points` per theme.
+"""
+
+from collections import defaultdict
+
+from sqlalchemy import func
+
+KEEP_RECENT_STEPS = 50
+BUCKET_SIZE = 10
+
+
+# --------------------------------------------------
+# LTTB
+# --------------------------------------------------
+def lttb(points, max_points, x="step", y="mean"):
+    """
+    Downsample a list of dicts (sorted by `x`) to at most `max_points` while
+    keeping the visual shape: first and last points are always kept, then one
+    point per bucket, the one forming the largest triangle with its neighbours.
+    """
+    n = len(points)
+    if max_points <= 0 or n <= max_points:
+        return list(points)
+    if max_points < 3:
+        return [points[0], points[-1]][:max_points]
+
+    sampled = [points[0]]
+    every = (n - 2) / (max_points - 2)
+    a = 0  # index of the last selected point
+
+    for i in range(max_points - 2):
+        # average of the *next* bucket (third vertex of the triangle)
+        start = int((i + 1) * every) + 1
+        end = min(int((i + 2) * every) + 1, n)
+        nxt = points[start:end] or [points[-1]]
+        avg_x = sum(p[x] for p in nxt) / len(nxt)
+        avg_y = sum(p[y] for p in nxt) / len(nxt)
+
+        # current bucket
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        ax, ay = points[a][x], points[a][y]
+
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - avg_x) * (points[j][y] - ay) - (ax - points[j][x]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+
+        sampled.append(points[best])
+        a = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+# --------------------------------------------------
+# COMPACTION
+# --------------------------------------------------
+def compact_snapshots(db, SnapModel, user_id=None, keep_recent=KEEP_RECENT_STEPS, bucket_size=BUCKET_SIZE):
+    """
+    Merge old snapshots into bucket averages, for one user or all of them.
+    The merged row keeps the bucket's last step (the chart x axis stays in
+    session units). Returns the number of rows removed. Caller commits.
+    """
+    users = [user_id] if user_id is not None else [
+        u for (u,) in db.session.query(SnapModel.user_id).distinct()
+    ]
+
+    removed = 0
+    for uid in users:
+        last_step = (
+            db.session.query(func.max(SnapModel.step))
+            .filter(SnapModel.user_id == uid)
+            .scalar()
+        ) or 0
+        # only whole buckets strictly before the recent window
+        cutoff = ((last_step - keep_recent) // bucket_size) * bucket_size
+        if cutoff <= 0:
+            continue
+
+        old = (
+            SnapModel.query
+            .filter(SnapModel.user_id == uid, SnapModel.step <= cutoff)
+            .order_by(SnapModel.theme, SnapModel.step)
+            .all()
+        )
+
+        buckets = defaultdict(list)
+        for snap in old:
+            buckets[(snap.theme, (snap.step - 1) // bucket_size)].append(snap)
+
+        for rows in buckets.values():
+            if len(rows) == 1:
+                continue
+            keep, drop = rows[-1], rows[:-1]
+            keep.alpha = sum(r.alpha for r in rows) / len(rows)
+            keep.beta = sum(r.beta for r in rows) / len(rows)
+            keep.mean = sum(r.mean for r in rows) / len(rows)
+            for r in drop:
+                db.session.delete(r)
+            removed += len(drop)
+
+    return removed
@@ -0,0 +1,80 @@
+# services/sqlite_profile.py
+"""
+SQLite production profile.
+
+With the defaults (rollback journal, synchronous=FULL, no busy timeout) every
+writer locks the whole file and readers wait for it, so concurrent sessions
+serialize and fail fast with "database is locked". The production profile:
+- journal_mode=WAL      : readers never block the writer (and vice versa)
+- synchronous=NORMAL    : fsync at checkpoint only; safe in WAL mode (a power
+                          loss can drop the last commits, never corrupt the file)
+- busy_timeout          : writers wait for the lock instead of erroring
+- mmap_size             : reads served from the page cache without copies
+- temp_store=MEMORY     : sorts / temp b-trees in RAM
+
+Pragmas are applied on every new DBAPI connection (engine "connect" event);
+journal_mode=WAL is persistent in the file itself.
+"""
+
+from sqlalchemy import event, text
+
+PRODUCTION_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,            # ms
+    "mmap_size": 256 * 1024 * 1024,  # bytes
+    "temp_store": "MEMORY",
+}
+
+# Columns and indexes added after the first release: created by db.create_all()
+# on new databases, by ensure_columns() / ensure_indexes() (idempotent) on existing ones
+COLUMNS = [
+    ("session_result", "sid", "VARCHAR(64)"),
+]
+
+INDEXES = [
+    # (name, table, columns, unique)
+    ("ix_user_seen_user_theme", "user_seen_question", ("user_id", "theme"), False),
+    ("ix_snapshot_user_theme_step", "user_theme_bandit_snapshot", ("user_id", "theme", "step"), False),
+    ("uq_session_result_sid", "session_result", ("sid",), True),
+]
+
+
+def apply_pragmas(dbapi_connection, pragmas=PRODUCTION_PRAGMAS):
+    """Works on any sqlite3 connection (SQLAlchemy's DBAPI one, or a raw one)."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def install_sqlite_profile(engine, pragmas=PRODUCTION_PRAGMAS):
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+
+
+def ensure_columns(db, columns=COLUMNS):
+    for table, column, sql_type in columns:
+        existing = {row[1] for row in db.session.execute(text(f"PRAGMA table_info({table})"))}
+        if existing and column not in existing:
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}"))
+    db.session.commit()
+
+
+def ensure_indexes(db, indexes=INDEXES):
+    ensure_columns(db)
+    for name, table, columns, unique in indexes:
+        db.session.execute(text(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+        ))
+    db.session.commit()
+
+
+def current_pragmas(db, names=("journal_mode", "synchronous", "busy_timeout", "mmap_size")):
+    return {name: db.session.execute(text(f"PRAGMA {name}")).scalar() for name in names}
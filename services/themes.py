@@ -69,3 +69,84 @@ def get_opentdb_categories(theme: str):
 def get_triviaapi_tags(theme: str):
     """Return TheTriviaAPI tags for a theme, or empty list."""
     return TRICKIA_THEMES.get(theme, {}).get("triviaapi", [])
+
+
+# --------------------------------------------------
+# PROVIDER CATEGORY NAMES -> TRICKIA THEME
+# (imports, event logs: questions that only carry a category label)
+# --------------------------------------------------
+
+OPENTDB_CATEGORY_NAMES = {
+    9: "General Knowledge",
+    10: "Entertainment: Books",
+    11: "Entertainment: Film",
+    12: "Entertainment: Music",
+    13: "Entertainment: Musicals & Theatres",
+    14: "Entertainment: Television",
+    15: "Entertainment: Video Games",
+    16: "Entertainment: Board Games",
+    17: "Science & Nature",
+    18: "Science: Computers",
+    19: "Science: Mathematics",
+    20: "Mythology",
+    21: "Sports",
+    22: "Geography",
+    23: "History",
+    24: "Politics",
+    25: "Art",
+    26: "Celebrities",
+    27: "Animals",
+    28: "Vehicles",
+    29: "Entertainment: Comics",
+    30: "Science: Gadgets",
+    31: "Entertainment: Japanese Anime & Manga",
+    32: "Entertainment: Cartoon & Animations",
+}
+
+# TheTriviaAPI display names + short labels found in old data/user_stats.json
+EXTRA_CATEGORY_THEMES = {
+    "Arts & Literature": "Arts & Culture",
+    "Film & TV": "Movies & TV",
+    "Food & Drink": "General Knowledge",
+    "Society & Culture": "Arts & Culture",
+    "Sport & Leisure": "Sports",
+    "Entertainment": "Movies & TV",
+    "Television": "Movies & TV",
+    "Video Games": "Technology",
+    "Mathematics": "Science",
+}
+
+
+def _build_category_index():
+    index = {}
+    for theme, providers in TRICKIA_THEMES.items():
+        index[theme.lower()] = theme
+        for category_id in providers.get("opentdb", []):
+            index[OPENTDB_CATEGORY_NAMES[category_id].lower()] = theme
+        for tag in providers.get("triviaapi", []):
+            index.setdefault(tag.lower(), theme)
+    for name, theme in EXTRA_CATEGORY_THEMES.items():
+        index.setdefault(name.lower(), theme)
+    return index
+
+
+CATEGORY_INDEX = _build_category_index()
+
+
+def theme_for_category(category):
+    """
+    Trickia theme for a provider category name or tag
+    ("Entertainment: Film", "Film & TV", "film", ...), or None.
+    """
+    if not category:
+        return None
+    key = category.strip().lower()
+    if key in CATEGORY_INDEX:
+        return CATEGORY_INDEX[key]
+    # "Science: Something new" -> "science"; "video games" -> "video_games";
+    # TheTriviaAPI slugs: "film_and_tv" -> "film & tv"
+    for candidate in (key.split(":")[0].strip(), key.replace(" ", "_"),
+                      key.replace("_and_", " & ").replace("_", " ")):
+        if candidate in CATEGORY_INDEX:
+            return CATEGORY_INDEX[candidate]
+    return None
@@ -0,0 +1,80 @@
+# services/write_behind.py
+"""
+Generic write-behind buffer.
+
+Request threads only append to an in-memory list; a daemon thread hands the
+accumulated items to `flush_fn(items)` every `max_delay` seconds, or as soon as
+`max_items` are waiting. `flush()` drains synchronously (session end, shutdown).
+
+Crash safety: items still buffered when the process dies are lost (at most
+`max_items` items / `max_delay` seconds of writes). Only use it for data that
+is either rebuildable or acceptable to lose on a hard crash; call flush() at
+the points where durability matters. A failed flush (ex: "database is locked")
+puts its items back in front of the buffer for the next attempt; past
+`max_backlog` items the oldest ones are dropped.
+"""
+
+import atexit
+import threading
+
+
+class WriteBehindBuffer:
+    def __init__(self, flush_fn, max_items=100, max_delay=1.0, max_backlog=None, name="write-behind"):
+        self.flush_fn = flush_fn
+        self.max_items = max_items
+        self.max_backlog = max_backlog or 100 * max_items
+        self.max_delay = max_delay
+        self.name = name
+
+        self._items = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # one flush at a time, in order
+        self._thread = None
+        atexit.register(self.flush)
+
+    def add(self, item):
+        self.add_many([item])
+
+    def add_many(self, items):
+        self._start()
+        with self._cond:
+            self._items.extend(items)
+            if len(self._items) >= self.max_items:
+                self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._items)
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of items written."""
+        with self._flush_lock:
+            with self._cond:
+                items, self._items = self._items, []
+            if not items:
+                return 0
+            try:
+                self.flush_fn(items)
+            except Exception:
+                with self._cond:
+                    self._items[:0] = items
+                    del self._items[:max(0, len(self._items) - self.max_backlog)]
+                raise
+            return len(items)
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._items) >= self.max_items, timeout=self.max_delay)
+            try:
+                self.flush()
+            except Exception:
+                pass  # items re-queued, retried at the next tick
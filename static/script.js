@@ -19,6 +19,12 @@ let bestStreak = 0;
 
 let canLoadNextQuestion = false;
 
+// Next question handed out by /api/answer (prefetched server-side)
+let prefetchedQuestion = null;
+
+// Idempotency key of this session's /api/session/end (a retry never counts twice)
+let sessionEndKey = null;
+
 // =============================================
 // PAGE DETECTION (PATCH IA)
 // =============================================
@@ -256,6 +262,10 @@ window.addEventListener("load", async () => {
         lastCorrectGlobal = 0;
         lastTotalGlobal = 0;
         bestStreak = 0;
+        prefetchedQuestion = null;
+        sessionEndKey = (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
 
         drawPieChart(0, 0);
 
@@ -269,7 +279,10 @@ window.addEventListener("load", async () => {
             await fetch("/api/session/start", {
             method: "POST",
             headers: {"Content-Type":"application/json"},
-            body: JSON.stringify({ themes: allowedThemes })
+            body: JSON.stringify({
+                themes: allowedThemes,
+                total_questions: sessionTotalQuestions
+            })
             });
         } catch (err) {
             console.error("Erreur démarrage session backend :", err);
@@ -340,8 +353,14 @@ window.addEventListener("load", async () => {
         
         try {
             canLoadNextQuestion = false;
-            const response = await fetch(url);
-            const data = await response.json();
+
+            // Prefetched by the server while the previous one was answered: no round trip
+            let data = prefetchedQuestion;
+            prefetchedQuestion = null;
+            if (!data) {
+                const response = await fetch(url);
+                data = await response.json();
+            }
 
             displayQuestion(data);
             canLoadNextQuestion = false; // réponse pas encore donnée
@@ -410,6 +429,15 @@ window.addEventListener("load", async () => {
 
             const r = await response.json();
 
+            // 409: this question was already scored (retry / double submit), count nothing
+            if (response.status === 409) {
+                canLoadNextQuestion = true;
+                return;
+            }
+
+            // Next question already served by the backend (may be absent)
+            prefetchedQuestion = r.next || null;
+
             // Global score from backend
             document.getElementById("score").textContent = r.score;
 
@@ -640,40 +668,40 @@ window.addEventListener("load", async () => {
     const badgeContainer = document.getElementById("badge-container");
 
     // ------------------------------------------
-    // 1️⃣ SAVE SESSION STATS (NON BLOQUANT)
+    // 1️⃣ FINALIZE SESSION (server-held stats, one request)
     // ------------------------------------------
     let sessionThemeStats = [];
+    let sessionBadges = [];
 
-    try {
-        const statsResponse = await fetch("/api/stats");
-        sessionThemeStats = await statsResponse.json();
-
-        const themeStatsPayload = {};
-        sessionThemeStats.forEach(s => {
-            if (s.total > 0) {
-                themeStatsPayload[s.theme] = {
-                    total: s.total,
-                    correct: s.correct
-                };
-            }
-        });
-
-        if (Object.keys(themeStatsPayload).length > 0) {
-            await fetch("/api/session/end", {
+    // same key on every attempt: a retry replays the first result once saved;
+    // 409 "in_progress" = the first request is still finalizing -> wait and ask again
+    for (let attempt = 0; attempt < 6; attempt++) {
+        if (attempt > 0) {
+            await new Promise(resolve => setTimeout(resolve, Math.min(2000, 250 * 2 ** (attempt - 1))));
+        }
+        try {
+            const res = await fetch("/api/session/end", {
                 method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({
-                    total_questions: sessionTotalQuestions,
-                    score: sessionCorrectAnswers,
-                    best_streak: bestStreak,
-                    total_time: quizTotalTimeSeconds,
-                    theme_stats: themeStatsPayload
-                })
+                headers: {
+                    "Content-Type": "application/json",
+                    "Idempotency-Key": sessionEndKey
+                },
+                body: "{}"
             });
-        }
+            if (res.status === 409) {
+                continue;
+            }
+            const result = await res.json();
 
-    } catch (err) {
-        console.error("Session save failed", err);
+            if (result.summary) {
+                sessionThemeStats = result.summary.themes;
+                sessionBadges = result.badges || [];
+            }
+            break;
+
+        } catch (err) {
+            console.error("Session save failed", err);
+        }
     }
 
     // ------------------------------------------
@@ -744,15 +772,13 @@ window.addEventListener("load", async () => {
             bottomList.appendChild(li);
         });
 
-        // Badges: only from best themes, with sufficient data
-        bestThemes
-            .filter(e => e.percent >= 85 && e.total >= 2)
-            .forEach(e => {
-                const badge = document.createElement("div");
-                badge.className = "badge-hexagon";
-                badge.textContent = `Expert in ${e.theme}!`;
-                badgeContainer.appendChild(badge);
-            });
+        // Badges: awarded server-side for this session
+        sessionBadges.forEach(b => {
+            const badge = document.createElement("div");
+            badge.className = "badge-hexagon";
+            badge.textContent = b.label;
+            badgeContainer.appendChild(badge);
+        });
     }
 }
 
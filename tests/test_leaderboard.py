@@ -0,0 +1,70 @@
+import threading
+import time
+
+from services.leaderboard import Leaderboards, RankIndex
+
+
+def test_rank_index_ties_and_updates():
+    index = RankIndex({1: 10, 2: 30, 3: 10})
+    assert index.rank(2) == 1
+    assert index.rank(1) == index.rank(3) == 2
+    assert index.top(3) == [(1, 2, 30), (2, 1, 10), (2, 3, 10)]
+
+    index.update(3, 50)
+    assert index.rank(3) == 1 and index.rank(2) == 2
+    index.remove(2)
+    assert index.rank(2) is None and len(index) == 2
+
+
+class SlowBoards(Leaderboards):
+    """Builds from an in-memory {user_id: total}; the rebuild can be held."""
+
+    def __init__(self, totals, **kwargs):
+        super().__init__(db=None, StatsModel=None, **kwargs)
+        self.totals = totals
+        self.builds = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def _build(self, metric, theme):
+        self.builds += 1
+        self.release.wait(5)
+        return RankIndex(dict(self.totals))
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_stale_board_is_served_while_rebuilt_in_background():
+    boards = SlowBoards({1: 10, 2: 20}, max_age=0.0)
+    assert boards.rank("total", 1) == (2, 10, 2)
+
+    boards.totals[3] = 30           # another worker's session, only in the DB
+    boards.release.clear()          # hold the rebuild
+    started = time.monotonic()
+    assert boards.rank("total", 1) == (2, 10, 2)  # stale board, no wait
+    assert time.monotonic() - started < 1.0
+
+    # recorded while the rebuild runs: replayed on the new board
+    boards.record(1, {"Science": {"total": 100, "correct": 50, "best_streak": 4}})
+    boards.release.set()
+    assert wait_for(lambda: not boards._rebuilding)
+
+    boards.max_age = 3600
+    assert boards.rank("total", 1) == (1, 100, 3)
+    assert boards.rank("total", 3) == (2, 30, 3)
+
+
+def test_one_rebuild_at_a_time():
+    boards = SlowBoards({1: 10}, max_age=0.0)
+    boards.board("total")
+    boards.release.clear()
+    for _ in range(5):
+        boards.board("total")
+    boards.release.set()
+    assert wait_for(lambda: not boards._rebuilding)
+    assert boards.builds == 2
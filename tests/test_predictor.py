@@ -0,0 +1,63 @@
+import pickle
+
+import numpy as np
+
+from ml.features import FEATURE_NAMES, UserFeatures
+from ml.predictor import ARTIFACT_FORMAT, Predictor
+
+
+def write_artifact(path, coef, intercept=0.0, metrics=None):
+    artifact = {
+        "format": ARTIFACT_FORMAT,
+        "version": "v-test",
+        "feature_names": list(FEATURE_NAMES),
+        "coef": np.asarray(coef, dtype=float),
+        "intercept": intercept,
+        "metrics": metrics if metrics is not None else {"log_loss": 0.5, "baseline_log_loss": 0.69},
+    }
+    with open(path, "wb") as f:
+        pickle.dump(artifact, f)
+    return path
+
+
+def difficulty_model(tmp_path, **kwargs):
+    # P(correct) only depends on difficulty: easy 0.88, medium 0.5, hard 0.12
+    coef = np.zeros(len(FEATURE_NAMES))
+    coef[FEATURE_NAMES.index("difficulty_easy")] = 2.0
+    coef[FEATURE_NAMES.index("difficulty_hard")] = -2.0
+    return Predictor(str(write_artifact(tmp_path / "model.pkl", coef, **kwargs)))
+
+
+CANDIDATES = [
+    ("Science", "hard", "OpenTriviaDB"),
+    ("Science", "easy", "OpenTriviaDB"),
+    ("History", "medium", "TheTriviaAPI"),
+    ("History", "easy", "TheTriviaAPI"),
+]
+
+
+def test_predict_known_model(tmp_path):
+    p = difficulty_model(tmp_path).predict(UserFeatures.empty(), CANDIDATES)
+    expected = 1 / (1 + np.exp(-np.array([-2.0, 2.0, 0.0, 2.0])))
+    assert np.allclose(p, expected)
+
+
+def test_rank_closest_to_target_first(tmp_path):
+    predictor = difficulty_model(tmp_path)
+    uf = UserFeatures.empty()
+    # |p - 0.5|: medium 0, hard and easy both 0.38 -> stable order
+    assert list(predictor.rank(uf, CANDIDATES, target=0.5)) == [2, 0, 1, 3]
+    # ties (both "easy") keep the caller's order
+    assert list(predictor.rank(uf, CANDIDATES, target=0.9)) == [1, 3, 2, 0]
+    assert list(predictor.rank(uf, CANDIDATES, target=0.1)) == [0, 2, 1, 3]
+
+
+def test_model_not_beating_baseline_is_ignored(tmp_path):
+    predictor = difficulty_model(tmp_path, metrics={"log_loss": 0.8, "baseline_log_loss": 0.69})
+    assert not predictor.ready
+    assert list(predictor.rank(UserFeatures.empty(), CANDIDATES, target=0.5)) == [0, 1, 2, 3]
+
+
+def test_model_without_metrics_is_ignored(tmp_path):
+    predictor = difficulty_model(tmp_path, metrics={})
+    assert not predictor.ready
@@ -0,0 +1,29 @@
+from services.provider_health import CLOSED, HALF_OPEN, OPEN, ProviderHealth
+
+
+def test_throttling_never_trips_the_breaker():
+    health = ProviderHealth("OpenTriviaDB", min_samples=5, failure_threshold=0.5)
+    # one request per 5 s allowed: 1 success, 2 rate limited, many rounds
+    for _ in range(10):
+        health.record(True, 0.1)
+        health.record_throttled()
+        health.record_throttled()
+    assert health.state == CLOSED
+    assert health.snapshot()["samples"] == 10
+
+
+def test_failures_still_trip_the_breaker():
+    health = ProviderHealth("OpenTriviaDB", min_samples=5, failure_threshold=0.5)
+    for ok in (True, False, True, False, False):
+        health.record(ok, 0.1)
+    assert health.state == OPEN
+
+
+def test_throttled_probe_frees_the_half_open_slot():
+    health = ProviderHealth("OpenTriviaDB", consecutive_failures=1, open_seconds=0.0)
+    health.record(False, 0.1)
+    assert health.state == HALF_OPEN
+    assert health.allow()
+    assert not health.allow()  # single probe in flight
+    health.record_throttled()
+    assert health.allow()
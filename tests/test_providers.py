@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from services.provider_health import CLOSED, HALF_OPEN, ProviderHealth
+from services.providers import ProviderClient, ProviderRateLimited, check_opentdb_response
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+def opentdb_client(min_interval):
+    client = ProviderClient("OpenTriviaDB", "http://opentdb.test", check=check_opentdb_response,
+                            min_interval=min_interval)
+    client.calls = 0
+
+    def get(*args, **kwargs):
+        client.calls += 1
+        return FakeResponse({"response_code": 0, "results": [{"question": "q"}]})
+
+    client.session.get = get
+    return client
+
+
+def test_paced_call_is_refused_locally():
+    client = opentdb_client(min_interval=5.0)
+    client.get_json("/api.php")
+    with pytest.raises(ProviderRateLimited) as e:
+        client.get_json("/api.php")
+    assert client.calls == 1  # nothing sent for the refused call
+    assert 0 < e.value.retry_after <= 5.0
+
+
+def test_paced_call_can_wait_for_its_slot():
+    client = opentdb_client(min_interval=0.05)
+    client.get_json("/api.php")
+    client.get_json("/api.php", wait=True)
+    assert client.calls == 2
+
+
+def test_no_pacing_by_default():
+    client = opentdb_client(min_interval=0.0)
+    for _ in range(3):
+        client.get_json("/api.php")
+    assert client.calls == 3
+
+
+def test_paced_refusal_frees_the_half_open_probe():
+    client = opentdb_client(min_interval=5.0)
+    client.health = ProviderHealth("OpenTriviaDB", consecutive_failures=1, open_seconds=0.0)
+    client.health.record(False, 0.1)
+    assert client.health.state == HALF_OPEN
+
+    client._next_slot = time.monotonic() + 5.0  # another caller took the slot
+    with pytest.raises(ProviderRateLimited):
+        client.get_json("/api.php")
+    assert client.calls == 0
+
+    client._next_slot = 0.0
+    client.get_json("/api.php")  # the next probe goes through and closes the circuit
+    assert client.health.state == CLOSED
@@ -0,0 +1,109 @@
+import base64
+import json
+
+import pytest
+
+from services.question_import import (
+    DECODERS, SkipRow, import_question_dump, iter_dump_items, parse_item, parse_opentdb, parse_triviaapi,
+)
+
+
+def opentdb(**overrides):
+    item = {
+        "type": "multiple", "difficulty": "easy", "category": "Science &amp; Nature",
+        "question": "What is H&lt;sub&gt;2&lt;/sub&gt;O?", "correct_answer": "Water",
+        "incorrect_answers": ["Salt", "Air", "Fire"],
+    }
+    item.update(overrides)
+    return item
+
+
+def triviaapi(**overrides):
+    item = {
+        "type": "text_choice", "difficulty": "hard", "category": "film_and_tv", "tags": ["film"],
+        "question": {"text": "Who directed Jaws?"}, "correctAnswer": "Steven Spielberg",
+        "incorrectAnswers": ["George Lucas", "Ridley Scott", "James Cameron"],
+    }
+    item.update(overrides)
+    return item
+
+
+def b64(value):
+    return base64.b64encode(value.encode("utf-8")).decode("ascii")
+
+
+def skip_reason(item, decode=DECODERS["html"]):
+    with pytest.raises(SkipRow) as e:
+        parse_item(item, decode)
+    return str(e.value)
+
+
+def test_opentdb_html_entities_are_decoded():
+    assert parse_opentdb(opentdb()) == (
+        "What is H<sub>2</sub>O?", "Water", ["Salt", "Air", "Fire"], "easy", "Science", "OpenTriviaDB"
+    )
+
+
+def test_opentdb_base64_dump():
+    item = {k: ([b64(a) for a in v] if isinstance(v, list) else b64(v)) for k, v in opentdb(
+        category="Entertainment: Film", question="Q & A?", difficulty="medium").items()}
+    question, correct, _, difficulty, theme, _ = parse_opentdb(item, DECODERS["base64"])
+    assert (question, correct, difficulty, theme) == ("Q & A?", "Water", "medium", "Movies & TV")
+
+
+def test_triviaapi_v1_and_v2_questions():
+    v2 = parse_triviaapi(triviaapi())
+    v1 = parse_triviaapi(triviaapi(question="Who directed Jaws?"))
+    assert v1 == v2 == (
+        "Who directed Jaws?", "Steven Spielberg", ["George Lucas", "Ridley Scott", "James Cameron"],
+        "hard", "Movies & TV", "TheTriviaAPI"
+    )
+
+
+def test_triviaapi_falls_back_to_tags():
+    assert parse_triviaapi(triviaapi(category="unlisted", tags=["oscars", "film"]))[4] == "Movies & TV"
+
+
+def test_skip_reasons():
+    assert skip_reason(opentdb(type="boolean")) == "not_multiple_choice"
+    assert skip_reason(opentdb(category="Nonsense")) == "unmapped_category"
+    assert skip_reason(opentdb(difficulty="")) == "unknown_difficulty"
+    assert skip_reason(triviaapi(difficulty="expert")) == "unknown_difficulty"
+    assert skip_reason(opentdb(correct_answer=" ")) == "malformed"
+    assert skip_reason(triviaapi(incorrectAnswers=None)) == "malformed"
+    assert skip_reason({"question": "?"}) == "unknown_shape"
+    assert skip_reason("not an object") == "malformed"
+
+
+def test_iter_dump_items_unwraps_api_responses():
+    lines = [
+        json.dumps({"response_code": 0, "results": [opentdb(), opentdb()]}),
+        "",
+        json.dumps([triviaapi()]),
+        "{not json",
+        json.dumps(opentdb()),
+    ]
+    items = list(iter_dump_items(lines))
+    assert len(items) == 5 and items[3] is None
+
+
+def make_question(question, correct, incorrect, difficulty, theme, source):
+    return {"hash": question, "question": question, "difficulty": difficulty, "theme": theme, "source": source}
+
+
+def test_import_report_batches_and_dedup():
+    lines = [json.dumps(x) for x in (
+        opentdb(), opentdb(), opentdb(difficulty="unknown"), opentdb(question="Other?"), triviaapi(),
+    )]
+    batches = []
+
+    def store(batch):
+        batches.append(batch)
+        return len(batch)
+
+    report = import_question_dump(lines, store, make_question, batch_size=2)
+    assert report["read"] == 5 and report["stored"] == 3
+    assert report["skipped"] == {"duplicate": 1, "unknown_difficulty": 1}
+    assert report["themes"] == {"Science": 2, "Movies & TV": 1}
+    assert [len(b) for b in batches] == [2, 1]
+    assert all(q["difficulty"] in ("easy", "medium", "hard") for b in batches for q in b)
@@ -0,0 +1,43 @@
+import hashlib
+
+from services.seen_filter import BloomFilter
+
+
+def hashes(prefix, n):
+    return [hashlib.sha256(f"{prefix}-{i}".encode()).hexdigest() for i in range(n)]
+
+
+def test_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    seen = hashes("seen", 1000)
+    for h in seen:
+        bloom.add(h)
+
+    assert all(h in bloom for h in seen)
+    false_positives = sum(h in bloom for h in hashes("other", 20000))
+    assert false_positives / 20000 < 0.02  # ~1% expected at capacity
+
+
+def test_add_reports_new_hashes_and_full():
+    bloom = BloomFilter(capacity=2, error_rate=0.01)
+    a, b, c = hashes("x", 3)
+    assert bloom.add(a) and not bloom.add(a)
+    bloom.add(b)
+    assert bloom.count == 2 and not bloom.full
+    bloom.add(c)
+    assert bloom.full
+
+
+def test_serialization_round_trip():
+    # what UserSeenFilter persists: capacity, error_rate, count, bytes(bits)
+    bloom = BloomFilter(capacity=500, error_rate=0.001)
+    seen = hashes("seen", 300)
+    for h in seen:
+        bloom.add(h)
+
+    restored = BloomFilter(bloom.capacity, bloom.error_rate, bits=bytes(bloom.bits), count=bloom.count)
+    assert (restored.m, restored.k, restored.count) == (bloom.m, bloom.k, bloom.count)
+    assert restored.bits == bloom.bits
+    assert all(h in restored for h in seen)
+    others = hashes("other", 2000)
+    assert [h in restored for h in others] == [h in bloom for h in others]
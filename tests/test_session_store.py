@@ -0,0 +1,84 @@
+import hashlib
+import time
+from datetime import datetime
+
+from services.session_store import (
+    DictRedis, LRUStore, QuizStateStore, RedisStore, TieredStore, decode_state, encode_state, short_hash,
+)
+
+
+def q_hash(i):
+    return hashlib.sha256(f"question-{i}".encode()).hexdigest()
+
+
+def quiz_state():
+    return {
+        "mode": "express",
+        "score": 3,
+        "asked": 5,
+        "used_hashes": {short_hash(q_hash(i)) for i in range(5)},
+        "start_time": datetime(2026, 3, 1, 12, 30, 15, 250000),
+        "excluded_themes": ["Sports"],
+    }
+
+
+def test_encode_decode_round_trip():
+    state = quiz_state()
+    raw = encode_state(state)
+    assert isinstance(raw, bytes)
+    assert decode_state(raw) == state
+    assert decode_state(raw.decode("utf-8")) == state
+    assert isinstance(state["start_time"], datetime)  # the caller's state is left alone
+
+
+def test_used_hashes_are_compact():
+    state = quiz_state()
+    state["used_hashes"] = {short_hash(q_hash(i)) for i in range(100)}
+    hex_list = len(",".join(f'"{q_hash(i)}"' for i in range(100)))
+    assert len(encode_state(state)) < hex_list / 4
+
+
+def test_empty_state():
+    decoded = decode_state(encode_state({"score": 0}))
+    assert decoded == {"score": 0, "used_hashes": set()}
+
+
+def test_lru_store_evicts_least_recently_used():
+    store = LRUStore(max_items=2)
+    store.set("a", b"1")
+    store.set("b", b"2")
+    store.get("a")
+    store.set("c", b"3")
+    assert (store.get("a"), store.get("b"), store.get("c")) == (b"1", None, b"3")
+
+
+def test_dict_redis_expiry():
+    client = DictRedis()
+    client.set("k", b"v", ex=0.05)
+    client.set("forever", b"v")
+    assert client.get("k") == b"v"
+    time.sleep(0.1)
+    assert client.get("k") is None and client.get("forever") == b"v"
+
+
+def test_tiered_facade_and_prefetched_question():
+    back = RedisStore(DictRedis())
+    store = QuizStateStore(TieredStore(LRUStore(), back))
+    state = quiz_state()
+    store.save("sid", state, user_id=1)
+    assert store.load("sid") == state
+    assert QuizStateStore(back).load("sid") == state  # written through
+
+    store.save_next("sid", {"question": "Q?"})
+    assert store.pop_next("sid") == {"question": "Q?"}
+    assert store.pop_next("sid") is None
+
+    store.delete("sid")
+    assert store.load("sid") is None and store.load(None) is None
+
+
+def test_replace_next_returns_the_unused_prefetch():
+    store = QuizStateStore(LRUStore())
+    assert store.replace_next("sid", {"hash": "a"}) is None
+    assert store.replace_next("sid", {"hash": "b"}) == {"hash": "a"}
+    assert store.pop_next("sid") == {"hash": "b"}
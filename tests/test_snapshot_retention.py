@@ -0,0 +1,38 @@
+import math
+
+import pytest
+
+from services.snapshot_retention import lttb
+
+
+def series(n):
+    return [{"step": i, "mean": math.sin(i / 7.0)} for i in range(n)]
+
+
+@pytest.mark.parametrize("n, max_points", [(1000, 60), (61, 60), (100, 3), (500, 499)])
+def test_output_size_and_endpoints(n, max_points):
+    points = series(n)
+    sampled = lttb(points, max_points)
+    assert len(sampled) == max_points
+    assert sampled[0] is points[0] and sampled[-1] is points[-1]
+    steps = [p["step"] for p in sampled]
+    assert steps == sorted(set(steps))  # ordered, no point picked twice
+
+
+def test_short_series_and_zero_are_unchanged():
+    points = series(10)
+    assert lttb(points, 60) == points
+    assert lttb(points, 10) == points
+    assert lttb(points, 0) == points
+
+
+def test_tiny_budget_keeps_endpoints():
+    points = series(10)
+    assert lttb(points, 2) == [points[0], points[-1]]
+    assert lttb(points, 1) == [points[0]]
+
+
+def test_spike_is_kept():
+    points = [{"step": i, "mean": 0.5} for i in range(200)]
+    points[123]["mean"] = 1.0
+    assert points[123] in lttb(points, 20)